@@ -3,18 +3,67 @@ Ollama Client - Local LLM integration for document Q&A.
 Uses a small, free model running locally via Ollama.
 """
 
+import asyncio
+import collections
+import httpx
 import ollama
 import logging
+import re
+import time
 from typing import Optional
 
+from .response_cache import LFUCache, SimilarQuestions, context_namespace, make_key
+
 logger = logging.getLogger(__name__)
 
 # Default model — use a tiny, fast model. User can change this.
 DEFAULT_MODEL = "tinyllama"
 
+# Explicitly set the host to avoid localhost resolution issues
+OLLAMA_HOST = "http://127.0.0.1:11434"
+
+# How long a successful availability check is trusted before re-listing models
+AVAILABILITY_TTL_SECONDS = 60.0
+
+# Upper bound on context tokens sent with each question
+MAX_CONTEXT_TOKENS = 1500
+
+# Approximate tokenizer: words and individual punctuation marks. Subword
+# tokenizers split at least this finely, so the count never undershoots much.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+# Most recent answers kept in `conversation_history` (chat itself is stateless)
+HISTORY_LIMIT = 50
+
+# Default cap on in-flight requests for achat_many
+MAX_CONCURRENT_CHATS = 4
+
+# How long Ollama keeps the model resident after a request
+KEEP_ALIVE = "30m"
+
 # Ultra-simple prompt for tiny models
 SYSTEM_PROMPT = "You are a document assistant. Read the provided text and answer the question directly using ONLY that text. If not in text, say 'Not found'. Keep it short."
 
+# Keep-alive connection pool shared by every agent, so chat/list calls reuse
+# one TCP connection to Ollama instead of reconnecting per request.
+HTTP_LIMITS = httpx.Limits(
+    max_keepalive_connections=10,
+    max_connections=20,
+    keepalive_expiry=30.0,
+)
+HTTP_TIMEOUT = httpx.Timeout(300.0, connect=10.0)
+
+UNREACHABLE_MESSAGE = (
+    f"⚠️ Ollama is not reachable at {OLLAMA_HOST}. Please ensure it is running.\n"
+    "Run: `ollama serve` in a terminal."
+)
+
+_shared_client = ollama.Client(
+    host=OLLAMA_HOST,
+    limits=HTTP_LIMITS,
+    timeout=HTTP_TIMEOUT,
+)
+
 
 class OllamaAgent:
     """
@@ -23,55 +72,129 @@ class OllamaAgent:
 
     def __init__(self, model: str = DEFAULT_MODEL):
         self.model = model
-        self.conversation_history: list[dict] = []
+        self.conversation_history: collections.deque = collections.deque(maxlen=HISTORY_LIMIT)
         self._available = None
-        # Explicitly set the host to avoid localhost resolution issues
-        self.client = ollama.Client(host='http://127.0.0.1:11434')
+        self._avail_checked_at = 0.0
+        self._avail_ttl = AVAILABILITY_TTL_SECONDS
+        self._model_names: list[str] = []
+        self._warmed_model: Optional[str] = None
+        self.client = _shared_client
+        # Async twin for FastAPI handlers, so a slow generation doesn't
+        # block the event loop while other requests are waiting.
+        self.aclient = ollama.AsyncClient(
+            host=OLLAMA_HOST,
+            limits=HTTP_LIMITS,
+            timeout=HTTP_TIMEOUT,
+        )
+        # Answers keyed on (model, normalized question, context digest)
+        self.cache = LFUCache()
+        # Questions with the same word set over the same context share cached answers
+        self.similar = SimilarQuestions()
+
+    def _availability_is_fresh(self) -> bool:
+        """True if a successful availability check is still within its TTL."""
+        return (
+            self._available is True
+            and time.monotonic() - self._avail_checked_at < self._avail_ttl
+        )
+
+    def _record_models(self, models_response):
+        """Cache the model list from a `list()` response and mark Ollama available."""
+        # Handle different response formats from various Ollama versions
+        if hasattr(models_response, 'models'):
+            model_names = [m.model for m in models_response.models]
+        elif isinstance(models_response, list):
+            model_names = [m.get('name') for m in models_response]
+        else:
+            model_names = []
+
+        self._available = True
+        self._avail_checked_at = time.monotonic()
+        self._model_names = model_names
+        self._warn_if_model_missing()
+
+    def _mark_unreachable(self, error: Exception):
+        logger.error(f"❌ Ollama not reachable at {OLLAMA_HOST}: {error}")
+        self._available = False
 
     def check_availability(self) -> bool:
-        """Check if Ollama is running and the model is available."""
+        """
+        Check if Ollama is running and the model is available.
+        A successful check is cached for `_avail_ttl` seconds so chat calls
+        don't pay an extra HTTP round-trip to `/api/tags` every time.
+        """
+        if self._availability_is_fresh():
+            return True
+
         try:
-            models_response = self.client.list()
-            # Handle different response formats from various Ollama versions
-            if hasattr(models_response, 'models'):
-                model_names = [m.model for m in models_response.models]
-            elif isinstance(models_response, list):
-                model_names = [m.get('name') for m in models_response]
-            else:
-                model_names = []
-            
-            self._available = True
-            
-            # Check for exact match or name:tag match
-            has_model = any(self.model in name for name in model_names)
-            
-            if not has_model:
-                logger.warning(
-                    f"⚠️ Model '{self.model}' not found in local Ollama. "
-                    f"Available: {model_names}. "
-                )
+            self._record_models(self.client.list())
             return True
         except Exception as e:
-            logger.error(f"❌ Ollama not reachable at 127.0.0.1:11434: {e}")
-            self._available = False
+            self._mark_unreachable(e)
             return False
 
-    def chat(
-        self,
-        user_message: str,
-        document_context: str = "",
-        stream: bool = False,
-    ) -> str:
+    async def acheck_availability(self) -> bool:
+        """Async variant of `check_availability` (shares the same cache)."""
+        if self._availability_is_fresh():
+            return True
+
+        try:
+            self._record_models(await self.aclient.list())
+            return True
+        except Exception as e:
+            self._mark_unreachable(e)
+            return False
+
+    def _warn_if_model_missing(self):
+        """Log a warning if the active model isn't in the cached model list."""
+        # Check for exact match or name:tag match
+        has_model = any(self.model in name for name in self._model_names)
+        if not has_model:
+            logger.warning(
+                f"⚠️ Model '{self.model}' not found in local Ollama. "
+                f"Available: {self._model_names}. "
+            )
+
+    def warmup(self) -> bool:
         """
-        Send a message to the LLM with optional document context.
+        Load the model into memory ahead of the first question.
+        Sends a 1-token generate with `keep_alive` so the model stays resident.
+        Safe to call repeatedly; only the first call per model does any work.
         """
+        if self._warmed_model == self.model:
+            return True
         if not self.check_availability():
-            return (
-                "⚠️ Ollama is not reachable at http://127.0.0.1:11434. Please ensure it is running.\n"
-                "Run: `ollama serve` in a terminal."
+            return False
+
+        start = time.monotonic()
+        try:
+            self.client.generate(
+                model=self.model,
+                prompt="warmup",
+                options={"num_predict": 1},
+                keep_alive=KEEP_ALIVE,
             )
+        except Exception as e:
+            logger.warning(f"⚠️ Model warmup failed for '{self.model}': {e}")
+            return False
+
+        self._warmed_model = self.model
+        logger.info(f"🔥 Model '{self.model}' warmed up in {time.monotonic() - start:.2f}s")
+        return True
 
+    @staticmethod
+    def _truncate_context(text: str, max_tokens: int = MAX_CONTEXT_TOKENS) -> str:
+        """Cut `text` after roughly `max_tokens` tokens to bound prompt prefill cost."""
+        for i, match in enumerate(_TOKEN_RE.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()].rstrip() + " ..."
+        return text
+
+    @classmethod
+    def _build_messages(cls, user_message: str, document_context: str) -> list[dict]:
+        """Build the stateless, context-grounded message list for one question."""
         if document_context:
+            document_context = cls._truncate_context(document_context)
             augmented_message = (
                 f"Context:\n{document_context}\n\n"
                 f"Question: {user_message}\n"
@@ -81,29 +204,120 @@ class OllamaAgent:
             augmented_message = f"Tell the user no document is available. Question: {user_message}"
 
         # Stateless grounded chat
-        messages = [
+        return [
             {"role": "system", "content": "You are a direct data extractor. Use bold bullet points. If context says 'NOT FOUND', answer 'Not found'."},
             {"role": "user",   "content": augmented_message},
         ]
 
+    def _cached_answer(self, cache_key: str, user_message: str, document_context: str) -> Optional[str]:
+        """Exact cache hit, else the answer to a near-identical earlier question."""
+        cached = self.cache.get(cache_key)
+        if cached is None:
+            similar_key = self.similar.lookup(
+                context_namespace(self.model, document_context), user_message
+            )
+            if similar_key is not None and similar_key != cache_key:
+                cached = self.cache.get(similar_key)
+        return cached
+
+    def _remember(self, cache_key: str, user_message: str, document_context: str, answer: str):
+        self.cache.put(cache_key, answer)
+        self.similar.add(context_namespace(self.model, document_context), user_message, cache_key)
+
+    def chat(
+        self,
+        user_message: str,
+        document_context: str = "",
+        stream: bool = False,
+    ) -> str:
+        """
+        Send a message to the LLM with optional document context.
+        """
+        cache_key = make_key(self.model, user_message, document_context)
+        cached = self._cached_answer(cache_key, user_message, document_context)
+        if cached is not None:
+            return cached
+
+        if not self.check_availability():
+            return UNREACHABLE_MESSAGE
+
+        messages = self._build_messages(user_message, document_context)
+
         try:
             response = self.client.chat(
                 model=self.model,
                 messages=messages,
+                keep_alive=KEEP_ALIVE,
             )
             assistant_message = response["message"]["content"]
             self.conversation_history.append({"role": "assistant", "content": assistant_message})
+            self._remember(cache_key, user_message, document_context, assistant_message)
             return assistant_message
         except Exception as e:
             return f"⚠️ Ollama Error: {str(e)}"
 
+    async def achat(
+        self,
+        user_message: str,
+        document_context: str = "",
+    ) -> str:
+        """
+        Async variant of `chat` for use from FastAPI handlers.
+        """
+        cache_key = make_key(self.model, user_message, document_context)
+        cached = self._cached_answer(cache_key, user_message, document_context)
+        if cached is not None:
+            return cached
+
+        if not await self.acheck_availability():
+            return UNREACHABLE_MESSAGE
+
+        messages = self._build_messages(user_message, document_context)
+
+        try:
+            response = await self.aclient.chat(
+                model=self.model,
+                messages=messages,
+                keep_alive=KEEP_ALIVE,
+            )
+            assistant_message = response["message"]["content"]
+            self.conversation_history.append({"role": "assistant", "content": assistant_message})
+            self._remember(cache_key, user_message, document_context, assistant_message)
+            return assistant_message
+        except Exception as e:
+            return f"⚠️ Ollama Error: {str(e)}"
+
+    async def achat_many(
+        self,
+        questions: list[tuple[str, str]],
+        max_concurrency: int = MAX_CONCURRENT_CHATS,
+    ) -> list[str]:
+        """
+        Answer several (user_message, document_context) pairs concurrently.
+        At most `max_concurrency` requests are in flight at once so Ollama can
+        overlap work without being flooded. Answers are returned in input order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def answer(user_message: str, document_context: str) -> str:
+            async with semaphore:
+                return await self.achat(user_message, document_context)
+
+        return await asyncio.gather(
+            *(answer(message, context) for message, context in questions)
+        )
+
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history = []
+        self.conversation_history.clear()
 
     def set_model(self, model: str):
         """Switch the LLM model."""
         self.model = model
-        self._available = None  # Force re-check
         self.clear_history()
+        if self._available:
+            # Reuse the cached model list instead of re-listing
+            self._warn_if_model_missing()
+        else:
+            self._available = None  # Force re-check
         logger.info(f"🔄 Model switched to: {model}")
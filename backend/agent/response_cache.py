@@ -0,0 +1,181 @@
+"""
+Response Cache - LFU cache for LLM answers.
+Repeated questions over the same context are answered from memory
+instead of re-running model inference.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+
+DEFAULT_CAPACITY = 50_000
+
+# Bounds for the near-duplicate index
+QUESTIONS_PER_NAMESPACE = 64
+MAX_NAMESPACES = 1024
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Words of a question; apostrophes stay inside ("isn't" is not "is")
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Lowercase and collapse whitespace so trivial rewrites share a key."""
+    return _WHITESPACE_RE.sub(" ", text).strip().lower()
+
+
+def context_namespace(model: str, document_context: str) -> str:
+    """Digest of (model, context); answers are only shared within one namespace."""
+    context_digest = hashlib.blake2b(
+        document_context.encode("utf-8"), digest_size=16
+    ).hexdigest()
+    return f"{model}|{context_digest}"
+
+
+def make_key(model: str, user_message: str, document_context: str) -> str:
+    """Build a cache key from (model, normalized question, context digest)."""
+    raw = f"{context_namespace(model, document_context)}|{normalize_prompt(user_message)}"
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def question_tokens(question: str) -> frozenset:
+    """Word set of a normalized question; equal sets share an answer."""
+    return frozenset(_WORD_RE.findall(question))
+
+
+class LFUCache:
+    """
+    Thread-safe least-frequently-used cache with optional TTL.
+    Ties between equally-used entries are broken by least-recent use.
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, ttl: Optional[float] = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # key -> [value, frequency, expires_at]
+        self._entries: dict[str, list] = {}
+        # frequency -> keys in least-recently-used order
+        self._buckets: defaultdict[int, OrderedDict] = defaultdict(OrderedDict)
+        self._min_freq = 0
+
+    def _touch(self, key: str, entry: list):
+        """Move a key up one frequency bucket."""
+        freq = entry[1]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+            if self._min_freq == freq:
+                self._min_freq = freq + 1
+        entry[1] = freq + 1
+        self._buckets[freq + 1][key] = None
+
+    def _remove(self, key: str):
+        freq = self._entries.pop(key)[1]
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._touch(key, entry)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: str):
+        if self.capacity <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry[0] = value
+                entry[2] = expires_at
+                self._touch(key, entry)
+                return
+
+            if len(self._entries) >= self.capacity:
+                if self._min_freq not in self._buckets:
+                    self._min_freq = min(self._buckets)
+                evicted, _ = self._buckets[self._min_freq].popitem(last=False)
+                if not self._buckets[self._min_freq]:
+                    del self._buckets[self._min_freq]
+                del self._entries[evicted]
+
+            self._entries[key] = [value, 1, expires_at]
+            self._buckets[1][key] = None
+            self._min_freq = 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._min_freq = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "capacity": self.capacity,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class SimilarQuestions:
+    """
+    Near-duplicate question index in front of an LFUCache.
+    Remembers the questions answered per (model, context) namespace, keyed by
+    their word sets (see `question_tokens`), so reorderings and punctuation or
+    repeated-word changes like "what is the fee?" / "the fee is what" reuse the
+    cached answer. Only identical word sets match: near spellings such as
+    "minimum" / "maximum" or "login" / "logout" differ by a few characters but
+    ask different things.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # namespace -> {word set -> cache key}, both in LRU order
+        self._namespaces: OrderedDict[str, OrderedDict] = OrderedDict()
+
+    def add(self, namespace: str, user_message: str, key: str):
+        tokens = question_tokens(normalize_prompt(user_message))
+        with self._lock:
+            questions = self._namespaces.get(namespace)
+            if questions is None:
+                questions = self._namespaces[namespace] = OrderedDict()
+                if len(self._namespaces) > MAX_NAMESPACES:
+                    self._namespaces.popitem(last=False)
+            else:
+                self._namespaces.move_to_end(namespace)
+            questions[tokens] = key
+            questions.move_to_end(tokens)
+            if len(questions) > QUESTIONS_PER_NAMESPACE:
+                questions.popitem(last=False)
+
+    def lookup(self, namespace: str, user_message: str) -> Optional[str]:
+        """Cache key of an answered question with the same word set, if any."""
+        tokens = question_tokens(normalize_prompt(user_message))
+        with self._lock:
+            questions = self._namespaces.get(namespace)
+            if not questions:
+                return None
+            return questions.get(tokens)
+
+    def clear(self):
+        with self._lock:
+            self._namespaces.clear()
@@ -4,36 +4,96 @@ Simple, file-based document storage for OCR-extracted text.
 No vector DB needed — uses keyword search for retrieval.
 """
 
-import json
+import bisect
+import heapq
+import numpy as np
+import orjson
 import os
+import re
 import uuid
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timezone
 from typing import Optional
 import logging
 
+from rapidfuzz import fuzz, process
+
 from ocr.text_cleaner import clean_ocr_text, chunk_ocr_text
 
 logger = logging.getLogger(__name__)
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 DB_FILE = os.path.join(DATA_DIR, "documents.json")
+# Append-only log of documents added/deleted since the last full snapshot
+JOURNAL_FILE = os.path.join(DATA_DIR, "documents.jsonl")
+# Fold the journal into DB_FILE after this many journal entries
+COMPACT_EVERY = 50
+
+# Flex regex for section refs: matches s12, s 12, sz12, etc.
+_SECTION_RE = re.compile(r'[sz]?\s*(\d+)')
+# Strict section refs used for snippet extraction: s12
+_SECTION_REF_RE = re.compile(r's(\d+)')
+
+# Word tokens used for the inverted index
+_TOKEN_RE = re.compile(r'\w+')
+
+# Recent get_context_for_query results kept until the documents change
+CONTEXT_CACHE_SIZE = 256
+
+# Documents with no exact keyword hit are only fuzzy-scored on this prefix
+FUZZY_PREFIX_CHARS = 2048
+
+# Below this many keyword/label candidates, search scores every document.
+# Fixed rather than tied to top_k, so a search's top results are the same
+# whatever top_k it was asked for.
+MIN_CANDIDATES = 5
 
 
 class KnowledgeStore:
     """
     JSON-based knowledge base for storing and retrieving OCR documents.
     Optimized for tiny LLMs by using structured chunking and section-aware search.
+
+    Additions and deletions are appended to a JSONL journal instead of
+    rewriting the whole snapshot; the journal is compacted into DB_FILE every
+    COMPACT_EVERY entries and on `flush()`.
     """
 
     def __init__(self):
+        self._data: dict = {}
+        # (DB_FILE, JOURNAL_FILE) mtimes as of the last load/save;
+        # lets _load skip files that haven't changed
+        self._file_stamp: Optional[tuple] = None
+        # id -> document dict (same objects as in self._data["documents"])
+        self._by_id: dict[str, dict] = {}
+        # content checksum -> id, for skipping re-uploads of the same file
+        self._by_checksum: dict[str, str] = {}
+        # id -> values derived from a document at index time (never persisted)
+        self._derived: dict[str, dict] = {}
+        # Inverted indexes: token -> doc ids, section label -> doc ids
+        self._postings: defaultdict[str, set] = defaultdict(set)
+        self._label_postings: defaultdict[str, set] = defaultdict(set)
+        # id -> insertion sequence, keeps candidate order equal to document order
+        self._seq: dict[str, int] = {}
+        self._next_seq = 0
+        # Sorted token list for prefix lookups; rebuilt lazily after changes
+        self._vocab: Optional[list] = None
+        # Running totals for get_stats, kept in step with the index
+        self._agg = self._empty_aggregates()
+        # get_all_documents() result; None when documents changed since it was built
+        self._summaries: Optional[list] = None
+        # Query results (context strings, lookups), in least-recently-used order
+        self._context_cache: OrderedDict = OrderedDict()
+        self._dirty = False
+        self._journal_count = 0
         os.makedirs(DATA_DIR, exist_ok=True)
         if not os.path.exists(DB_FILE):
             self._init_db()
         self._load()
 
     def _init_db(self):
-        """Initialize empty database file."""
-        data = {
+        """Initialize empty database file (keeping anything left in the journal)."""
+        self._data = {
             "documents": [],
             "metadata": {
                 "created_at": datetime.now(timezone.utc).isoformat(),
@@ -41,27 +101,228 @@ class KnowledgeStore:
                 "total_documents": 0,
             },
         }
-        self._save(data)
+        self._rebuild_index()
+        self._replay_journal()
+        self._dirty = True
+        self._save()
+
+    def _rebuild_index(self):
+        """Rebuild lookup tables after the document list was replaced."""
+        self._by_id = {}
+        self._by_checksum = {}
+        self._derived = {}
+        self._postings = defaultdict(set)
+        self._label_postings = defaultdict(set)
+        self._seq = {}
+        self._next_seq = 0
+        self._vocab = None
+        self._agg = self._empty_aggregates()
+        self._invalidate_views()
+        for doc in self._data["documents"]:
+            self._index_document(doc)
+
+    def _invalidate_views(self):
+        """Drop results derived from the document set after it changes."""
+        self._summaries = None
+        self._context_cache.clear()
+
+    @staticmethod
+    def _empty_aggregates() -> dict:
+        return {"total_chars": 0, "total_chunks": 0, "conf_sum": 0.0}
+
+    def _update_aggregates(self, doc: dict, sign: int):
+        """Add (sign=1) or subtract (sign=-1) a document's contribution to the stats."""
+        self._agg["total_chars"] += sign * len(doc["extracted_text"])
+        self._agg["total_chunks"] += sign * len(doc.get("chunks", []))
+        self._agg["conf_sum"] += sign * doc["ocr_confidence"]
+
+    def _index_document(self, doc: dict):
+        """Register a document in the lookup tables and precompute search fields."""
+        doc_id = doc["id"]
+        text_lower = doc["extracted_text"].lower()
+        label_map = {c["label"]: c["text"] for c in doc.get("chunks", [])}
+        derived = {
+            "text_lower": text_lower,
+            "label_map": label_map,
+            "labels": list(label_map),
+            "tokens": set(_TOKEN_RE.findall(text_lower)),
+        }
+        self._by_id[doc_id] = doc
+        if doc.get("checksum"):
+            self._by_checksum[doc["checksum"]] = doc_id
+        self._derived[doc_id] = derived
+        self._seq[doc_id] = self._next_seq
+        self._next_seq += 1
+        self._invalidate_views()
+        self._update_aggregates(doc, 1)
+        for token in derived["tokens"]:
+            if token not in self._postings:
+                self._vocab = None
+            self._postings[token].add(doc_id)
+        for label in derived["labels"]:
+            self._label_postings[label].add(doc_id)
+
+    def _unindex_document(self, doc_id: str) -> Optional[dict]:
+        """Remove a document from the lookup tables; returns it if present."""
+        derived = self._derived.pop(doc_id, None)
+        if derived is not None:
+            self._seq.pop(doc_id, None)
+            for token in derived["tokens"]:
+                self._discard_posting(self._postings, token, doc_id)
+            for label in derived["labels"]:
+                self._discard_posting(self._label_postings, label, doc_id)
+        doc = self._by_id.pop(doc_id, None)
+        if doc is not None:
+            if self._by_checksum.get(doc.get("checksum")) == doc_id:
+                del self._by_checksum[doc["checksum"]]
+            self._invalidate_views()
+            self._update_aggregates(doc, -1)
+        return doc
+
+    def _discard_posting(self, postings: dict, key: str, doc_id: str):
+        ids = postings.get(key)
+        if ids is not None:
+            ids.discard(doc_id)
+            if not ids:
+                del postings[key]
+                self._vocab = None
+
+    def _candidate_documents(self, query_words: list, requested_labels: list) -> list:
+        """
+        Documents containing a word that starts with one of the query words
+        (so "password" also finds "passwords") or one of the requested section
+        labels, in storage order. When that yields fewer than MIN_CANDIDATES
+        documents every document is returned, so typo-only queries still reach
+        the fuzzy scorer.
+
+        Otherwise documents outside that set are not scored at all: one that
+        matches a query word only by a typo, inside a longer word ("word" in
+        "password") or through a fuzzy section label no longer appears in
+        the results.
+        """
+        if self._vocab is None:
+            self._vocab = sorted(self._postings)
+        candidate_ids = set()
+        for word in query_words:
+            for prefix in _TOKEN_RE.findall(word):
+                i = bisect.bisect_left(self._vocab, prefix)
+                while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+                    candidate_ids |= self._postings[self._vocab[i]]
+                    i += 1
+        for label in requested_labels:
+            candidate_ids |= self._label_postings.get(label, set())
+        if len(candidate_ids) < MIN_CANDIDATES:
+            return self._data["documents"]
+        return [self._by_id[i] for i in sorted(candidate_ids, key=self._seq.__getitem__)]
+
+    @staticmethod
+    def _stat_files() -> tuple:
+        """Current mtimes of the snapshot and journal (None if missing)."""
+        stamp = []
+        for path in (DB_FILE, JOURNAL_FILE):
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _replay_journal(self) -> bool:
+        """
+        Apply additions and deletions journaled since the last snapshot.
+        Returns False if an unreadable entry was skipped.
+        """
+        self._journal_count = 0
+        try:
+            with open(JOURNAL_FILE, "rb") as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return True
+
+        intact = True
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                doc = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A crash mid-append can leave a truncated last line
+                logger.warning("⚠️ Skipping unreadable journal entry")
+                intact = False
+                continue
+            self._journal_count += 1
+            if "deleted" in doc:
+                removed = self._unindex_document(doc["deleted"])
+                if removed is not None:
+                    self._data["documents"].remove(removed)
+            elif doc["id"] not in self._by_id:
+                self._data["documents"].append(doc)
+                self._index_document(doc)
+        return intact
 
     def _load(self) -> dict:
-        """Load the JSON database into memory."""
+        """
+        Load the JSON database into memory.
+        The files are only re-read and re-parsed if their mtimes changed since
+        the last load/save; otherwise the in-memory copy is returned as-is.
+        """
+        stamp = self._stat_files()
+        if stamp[0] is not None and stamp == self._file_stamp:
+            return self._data
+
         try:
-            with open(DB_FILE, "r", encoding="utf-8") as f:
-                self._data = json.load(f)
-        except (json.JSONDecodeError, FileNotFoundError):
+            with open(DB_FILE, "rb") as f:
+                self._data = orjson.loads(f.read())
+            self._rebuild_index()
+            journal_intact = self._replay_journal()
+            self._file_stamp = stamp
+            self._dirty = False
+            if not journal_intact:
+                # Rewrite the snapshot so later appends don't land after a broken
+                # line; forced, since a journal holding only that line counts 0
+                self._dirty = True
+                self._save()
+        except (orjson.JSONDecodeError, FileNotFoundError):
             logger.warning("⚠️ Corrupted or missing DB, reinitializing...")
             self._init_db()
-            with open(DB_FILE, "r", encoding="utf-8") as f:
-                self._data = json.load(f)
         return self._data
 
-    def _save(self, data: Optional[dict] = None):
-        """Write the current state to disk."""
-        if data is None:
-            data = self._data
+    def _save(self):
+        """
+        Write the full state to disk if anything changed, and truncate the journal.
+        Writes go to a temp file first and are swapped in with os.replace,
+        so a crash mid-write never leaves a half-written DB_FILE.
+        """
+        if not self._dirty and not self._journal_count:
+            return
+        data = self._data
         data["metadata"]["total_documents"] = len(data["documents"])
-        with open(DB_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        tmp_path = DB_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps(data))
+        os.replace(tmp_path, DB_FILE)
+        # Everything in the journal is now part of the snapshot
+        if os.path.exists(JOURNAL_FILE):
+            os.remove(JOURNAL_FILE)
+        self._journal_count = 0
+        self._dirty = False
+        self._file_stamp = self._stat_files()
+
+    def _append_to_journal(self, entry: dict):
+        """
+        Persist one change in O(1) by appending it to the journal.
+        Entries are either a full document or a `{"deleted": doc_id}` tombstone.
+        """
+        with open(JOURNAL_FILE, "ab") as f:
+            f.write(orjson.dumps(entry) + b"\n")
+        self._journal_count += 1
+        if self._journal_count >= COMPACT_EVERY:
+            self._save()
+        else:
+            self._file_stamp = self._stat_files()
+
+    def flush(self):
+        """Compact the journal into DB_FILE (call on shutdown)."""
+        self._save()
 
     def add_document(
         self,
@@ -73,6 +334,7 @@ class KnowledgeStore:
         file_size: int = 0,
         mime_type: str = "",
         image_path: str = "",
+        checksum: str = "",
     ) -> dict:
         """
         Store a new OCR-processed document in the knowledge base.
@@ -83,7 +345,7 @@ class KnowledgeStore:
 
         # Clean and chunk the text immediately
         cleaned_text = clean_ocr_text(extracted_text)
-        chunks = chunk_ocr_text(extracted_text)
+        chunks = chunk_ocr_text(cleaned_text, pre_cleaned=True)
 
         document = {
             "id": doc_id,
@@ -97,6 +359,7 @@ class KnowledgeStore:
             "blocks": [],  # Clear blocks for main storage to reduce noise/size
             "file_size_bytes": file_size,
             "mime_type": mime_type,
+            "checksum": checksum,
             "created_at": now,
             "updated_at": now,
             "tags": [],
@@ -104,7 +367,8 @@ class KnowledgeStore:
         }
 
         self._data["documents"].append(document)
-        self._save()
+        self._index_document(document)
+        self._append_to_journal(document)
 
         # Optionally save full block data to a sidecar file if needed
         # (For now we omit it to keep the DB file clean as requested)
@@ -113,101 +377,163 @@ class KnowledgeStore:
         return document
 
     def get_all_documents(self) -> list:
-        """Get all documents (metadata only)."""
+        """Get all documents (metadata only). Summaries are rebuilt only after changes."""
         self._load()
-        docs = []
-        for doc in self._data["documents"]:
-            summary = {
-                "id": doc["id"],
-                "filename": doc["filename"],
-                "source_type": doc["source_type"],
-                "ocr_confidence": doc["ocr_confidence"],
-                "chunk_count": len(doc.get("chunks", [])),
-                "created_at": doc["created_at"],
-                "text_preview": doc["extracted_text"][:200] + "...",
-            }
-            docs.append(summary)
-        return docs
+        if self._summaries is None:
+            self._summaries = [
+                {
+                    "id": doc["id"],
+                    "filename": doc["filename"],
+                    "source_type": doc["source_type"],
+                    "ocr_confidence": doc["ocr_confidence"],
+                    "chunk_count": len(doc.get("chunks", [])),
+                    "created_at": doc["created_at"],
+                    "text_preview": doc["extracted_text"][:200] + "...",
+                }
+                for doc in self._data["documents"]
+            ]
+        return list(self._summaries)
 
     def get_document(self, doc_id: str) -> Optional[dict]:
         """Get a specific document by ID."""
         self._load()
-        for doc in self._data["documents"]:
-            if doc["id"] == doc_id:
-                return doc
-        return None
+        return self._by_id.get(doc_id)
+
+    def find_by_checksum(self, checksum: str) -> Optional[dict]:
+        """Get the document previously stored for identical file contents."""
+        self._load()
+        doc_id = self._by_checksum.get(checksum)
+        return self._by_id.get(doc_id) if doc_id else None
 
     def delete_document(self, doc_id: str) -> bool:
         """Delete a document by ID."""
         self._load()
-        original_len = len(self._data["documents"])
-        self._data["documents"] = [
-            d for d in self._data["documents"] if d["id"] != doc_id
-        ]
-        if len(self._data["documents"]) < original_len:
-            self._save()
-            logger.info(f"🗑️ Document deleted: {doc_id}")
-            return True
-        return False
+        doc = self._unindex_document(doc_id)
+        if doc is None:
+            return False
+        self._data["documents"].remove(doc)
+        self._append_to_journal({"deleted": doc_id})
+        logger.info(f"🗑️ Document deleted: {doc_id}")
+        return True
 
     def search(self, query: str, top_k: int = 5) -> list:
         """
         Search across documents. Uses FUZZY matching for section labels and keywords.
         """
         self._load()
-        from rapidfuzz import fuzz, process
-        
         query_lower = query.lower()
         
         # 1. Extract potential section markers (e.g., s12, sz12, s 12)
-        import re
-        potential_nums = re.findall(r'[sz]?\s*(\d+)', query_lower)
+        potential_nums = _SECTION_RE.findall(query_lower)
         requested_labels = [f"S{num}" for num in potential_nums]
 
         # 2. Extract potential keywords (filter out short noise)
         query_words = [w for w in query_lower.split() if len(w) > 3]
 
+        docs = self._candidate_documents(query_words, requested_labels)
+        derived_docs = [self._derived[doc["id"]] for doc in docs]
+        texts_lower = [derived["text_lower"] for derived in derived_docs]
+
+        # Exact word hits: a whole-token match is a set lookup, anything else
+        # (plural prefixes, punctuation) falls back to a substring check. Only
+        # words missing from some document need fuzzy scoring, done in one
+        # batched C call.
+        exact_hits = np.array(
+            [
+                [
+                    word in derived["tokens"] or word in derived["text_lower"]
+                    for derived in derived_docs
+                ]
+                for word in query_words
+            ],
+            dtype=bool,
+        ).reshape(len(query_words), len(docs))
+        phrase_hits = np.fromiter(
+            (query_lower in text_lower for text_lower in texts_lower),
+            dtype=bool,
+            count=len(texts_lower),
+        )
+        fuzzy_hits = np.zeros_like(exact_hits)
+        fuzzy_rows = np.flatnonzero(~exact_hits.all(axis=1))
+        if fuzzy_rows.size:
+            # Documents where every one of those words hit exactly need no
+            # fuzzy pass at all
+            fuzzy_cols = np.flatnonzero(~exact_hits[fuzzy_rows].all(axis=0))
+            # A document that contains neither the query nor any query word is
+            # unlikely to be relevant; cap its fuzzy cost to a short prefix.
+            has_exact = phrase_hits | exact_hits.any(axis=0)
+            fuzzy_targets = [
+                texts_lower[j] if has_exact[j] else texts_lower[j][:FUZZY_PREFIX_CHARS]
+                for j in fuzzy_cols
+            ]
+            # partial_ratio is good for "securit" -> "security"
+            matrix = process.cdist(
+                [query_words[i] for i in fuzzy_rows],
+                fuzzy_targets,
+                scorer=fuzz.partial_ratio,
+                score_cutoff=85,
+                workers=-1,
+            )
+            fuzzy_hits[np.ix_(fuzzy_rows, fuzzy_cols)] = matrix > 85
+
+        # --- Keyword Fuzzy Matching ---
+        # Scored for all documents at once: +100 for the whole query, +40 per
+        # exact word, +30 per word that only matched fuzzily
+        scores = (
+            100 * phrase_hits
+            + 40 * exact_hits.sum(axis=0)
+            + 30 * (fuzzy_hits & ~exact_hits).sum(axis=0)
+        )
+
+        # --- Section Label Fuzzy Matching ---
+        # requested label -> matching chunk label, reused by get_context_for_query
+        label_matches = [{} for _ in docs]
+        if requested_labels:
+            # Score every requested label against every distinct chunk label
+            # of the candidates in one batched call; each document then just
+            # picks its best column per request.
+            label_index = {}
+            for derived in derived_docs:
+                for label in derived["labels"]:
+                    label_index.setdefault(label, len(label_index))
+            if label_index:
+                label_matrix = process.cdist(
+                    requested_labels,
+                    list(label_index),
+                    scorer=fuzz.ratio,
+                    score_cutoff=85,
+                    workers=-1,
+                )
+            for j, derived in enumerate(derived_docs):
+                chunk_labels = derived["labels"]
+                if not chunk_labels:
+                    continue
+                doc_scores = label_matrix[:, [label_index[label] for label in chunk_labels]]
+                # argmax keeps the first of equally good labels, like extractOne
+                best = doc_scores.argmax(axis=1)
+                for r, req in enumerate(requested_labels):
+                    if req in derived["label_map"]:
+                        # Exact label: same result as the fuzzy scorer
+                        scores[j] += 150
+                        label_matches[j][req] = req
+                    elif doc_scores[r, best[r]] > 85:
+                        scores[j] += 150
+                        label_matches[j][req] = chunk_labels[best[r]]
+
+        # Results stay lightweight; text and chunks are looked up by id when needed
         scored_docs = []
-        for doc in self._data["documents"]:
-            text = doc["extracted_text"]
-            text_lower = text.lower()
-            score = 0
-            
-            # --- Keyword Fuzzy Matching ---
-            if query_lower in text_lower:
-                score += 100
-            
-            # Additional word-based scoring
-            for word in query_words:
-                if word in text_lower:
-                    score += 40
-                else:
-                    # Fuzzy match for word
-                    # partial_ratio is good for "securit" -> "security"
-                    best_word_score = fuzz.partial_ratio(word, text_lower)
-                    if best_word_score > 85:
-                        score += 30
-
-            # --- Section Label Fuzzy Matching ---
-            chunk_labels = [c["label"] for c in doc.get("chunks", [])]
-            if chunk_labels and requested_labels:
-                for req in requested_labels:
-                    match = process.extractOne(req, chunk_labels, scorer=fuzz.ratio)
-                    if match and match[1] > 85:
-                        score += 150
-            
-            if score > 0:
-                scored_docs.append({
-                    "id": doc["id"],
-                    "filename": doc["filename"],
-                    "score": score,
-                    "text": text,
-                    "chunks": doc.get("chunks", []),
-                    "created_at": doc["created_at"],
-                })
+        for j in np.flatnonzero(scores > 0):
+            doc = docs[j]
+            scored_docs.append({
+                "id": doc["id"],
+                "filename": doc["filename"],
+                "score": int(scores[j]),
+                "label_matches": label_matches[j],
+                "created_at": doc["created_at"],
+            })
 
-        scored_docs.sort(key=lambda x: x["score"], reverse=True)
-        return scored_docs[:top_k]
+        # Same order as a stable descending sort, without sorting everything
+        return heapq.nlargest(top_k, scored_docs, key=lambda x: x["score"])
 
     @staticmethod
     def extract_relevant_snippet(doc: dict, query: str, window: int = 1200) -> str:
@@ -217,15 +543,16 @@ class KnowledgeStore:
         query_lower = query.lower()
         
         # 1. Try strategy: Multiple Chunk match
-        import re
-        all_refs = re.findall(r's(\d+)', query_lower)
+        all_refs = _SECTION_REF_RE.findall(query_lower)
         if all_refs:
             found_chunks = []
             seen = set()
             requested = [f"S{ref}" for ref in all_refs]
             
-            # Map of labels to text
-            chunk_map = {c["label"]: c["text"] for c in doc.get("chunks", [])}
+            # Map of labels to text (precomputed for search results)
+            chunk_map = doc.get("label_map")
+            if chunk_map is None:
+                chunk_map = {c["label"]: c["text"] for c in doc.get("chunks", [])}
             
             for label in requested:
                 if label in seen: continue
@@ -240,30 +567,19 @@ class KnowledgeStore:
 
         # 2. Try strategy: Context around match
         text = doc.get("text", doc.get("extracted_text", ""))
-        text_lower = text.lower()
+        text_lower = doc.get("text_lower") or text.lower()
         idx = text_lower.find(query_lower)
         
         match_quality = 0 # 0 to 1
         if idx != -1:
             match_quality = 1.0
         else:
-            # Try fuzzy matching to find the best block of text
-            from rapidfuzz import fuzz, utils
-            words = text_lower.split()
-            best_score = 0
-            best_idx = 0
-            
-            window_size = len(query_lower.split()) + 2
-            for i in range(len(words) - window_size):
-                window_text = " ".join(words[i:i+window_size])
-                score = fuzz.ratio(query_lower, window_text)
-                if score > best_score:
-                    best_score = score
-                    best_idx = text_lower.find(window_text)
-            
-            if best_score > 70:
-                idx = best_idx
-                match_quality = best_score / 100.0
+            # Try fuzzy matching to find the best block of text; RapidFuzz
+            # slides the query over the text in C and reports where it aligned
+            alignment = fuzz.partial_ratio_alignment(query_lower, text_lower, score_cutoff=70)
+            if alignment is not None and alignment.score > 70:
+                idx = alignment.dest_start
+                match_quality = alignment.score / 100.0
 
         if idx == -1:
             return text[:600] # Default small window for no match
@@ -281,45 +597,84 @@ class KnowledgeStore:
         if end < len(text): snippet = snippet + "..."
         return snippet
 
+    def _cached(self, key: tuple, compute):
+        """Return the cached value for `key`, computing and storing it on a miss."""
+        self._load()
+        value = self._context_cache.get(key)
+        if value is None:
+            value = compute()
+            self._context_cache[key] = value
+            if len(self._context_cache) > CONTEXT_CACHE_SIZE:
+                self._context_cache.popitem(last=False)
+        else:
+            self._context_cache.move_to_end(key)
+        return value
+
     def get_context_for_query(self, query: str, max_chars: int = 3000) -> str:
         """
         Aggregates relevant chunks across the best matching documents.
         Handles multi-section queries (S1, S2, S3) by finding each globally (with fuzzy).
+        Results are cached until a document is added, deleted or reloaded.
+        """
+        return self._cached(
+            ("context", query, max_chars),
+            lambda: self._build_context(query, self.search(query, top_k=3)),
+        )
+
+    def lookup(self, query: str, top_k: int = 5) -> tuple[str, list]:
+        """
+        Context and ranked search results for a query from a single search.
+        The context is built from the first three results, as in
+        `get_context_for_query`. Cached the same way; the results returned are
+        copies, so callers may modify them without touching the cache.
         """
-        results = self.search(query, top_k=3)
+        def compute():
+            results = self.search(query, top_k=top_k)
+            return self._build_context(query, results[:3]), results
+
+        context, results = self._cached(("lookup", query, top_k), compute)
+        return context, [
+            dict(r, label_matches=dict(r["label_matches"])) for r in results
+        ]
+
+    def _build_context(self, query: str, results: list) -> str:
         if not results:
             return ""
 
-        from rapidfuzz import fuzz, process
-        import re
         query_lower = query.lower()
         
-        # Flex regex for section refs: matches s12, s 12, sz12, etc.
-        requested_nums = re.findall(r'[sz]?\s*(\d+)', query_lower)
+        requested_nums = _SECTION_RE.findall(query_lower)
         requested_labels = [f"S{num}" for num in requested_nums]
         
         if not requested_labels:
             # Fallback to standard window extraction
             context_parts = []
             for res in results:
-                context_parts.append(f"[From: {res['filename']}]\n" + self.extract_relevant_snippet(res, query))
+                doc = dict(self._derived[res["id"]], text=self._by_id[res["id"]]["extracted_text"])
+                context_parts.append(f"[From: {res['filename']}]\n" + self.extract_relevant_snippet(doc, query))
             return "\n\n---\n\n".join(context_parts)
 
         # Global fuzzy section search across all top results
         found_data = {} # label -> (text, source)
         
         for res in results:
-            chunks = {c["label"]: c["text"] for c in res.get("chunks", [])}
-            chunk_labels = list(chunks.keys())
+            chunks = self._derived[res["id"]]["label_map"]
             
             for req in requested_labels:
                 if req in found_data: continue
-                # Fuzzy match requested label against this document's chunks
-                match = process.extractOne(req, chunk_labels, scorer=fuzz.ratio)
-                if match and match[1] > 85:
-                    matched_label = match[0]
+                # search() already fuzzy-matched requested labels against this document's chunks
+                matched_label = res["label_matches"].get(req)
+                if matched_label:
                     found_data[req] = (chunks[matched_label], res["filename"], matched_label)
 
+        # Labels the top results lack may still exist verbatim in another document
+        for req in requested_labels:
+            if req in found_data: continue
+            doc_ids = self._label_postings.get(req)
+            if doc_ids:
+                doc = self._by_id[min(doc_ids, key=self._seq.__getitem__)]
+                found_data[req] = (self._derived[doc["id"]]["label_map"][req], doc["filename"], req)
+
         # Build unified report
         report = []
         for req_label in requested_labels:
@@ -333,16 +688,13 @@ class KnowledgeStore:
         return "\n\n".join(report)
 
     def get_stats(self) -> dict:
-        """Get knowledge base statistics."""
+        """Get knowledge base statistics (from running totals, no document scan)."""
         self._load()
-        docs = self._data["documents"]
-        total_text = sum(len(d["extracted_text"]) for d in docs)
+        count = len(self._data["documents"])
+        agg = self._agg
         return {
-            "total_documents": len(docs),
-            "total_chunks": sum(len(d.get("chunks", [])) for d in docs),
-            "total_characters": total_text,
-            "avg_confidence": (
-                sum(d["ocr_confidence"] for d in docs) / len(docs)
-                if docs else 0
-            ),
+            "total_documents": count,
+            "total_chunks": agg["total_chunks"],
+            "total_characters": agg["total_chars"],
+            "avg_confidence": agg["conf_sum"] / count if count else 0,
         }
@@ -3,15 +3,24 @@ Demo-OCR API Server
 FastAPI backend powering the OCR Chat Interface.
 """
 
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
+from email.utils import formatdate
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import mmap
 import os
+import uuid
 import logging
 import httpx
+import pybase64  # SIMD base64 codec, drop-in for the stdlib module
 
 # Configure logging
 logging.basicConfig(
@@ -23,6 +32,14 @@ logger = logging.getLogger("demo-ocr")
 
 OLLAMA_URL = "http://127.0.0.1:11434"
 
+# Extraction jobs that may run at once (see `extraction_executor`)
+EXTRACTION_WORKERS = min(4, os.cpu_count() or 1)
+
+# Split the cores between concurrent extractions so torch/OpenMP thread pools
+# don't oversubscribe the CPU. Must be set before easyocr imports torch.
+for _var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, str(max(1, (os.cpu_count() or 1) // EXTRACTION_WORKERS)))
+
 # Late imports to avoid slow startup logs before config
 from ocr.engine import OCREngine
 from ocr.document_extractor import (
@@ -35,10 +52,27 @@ from agent.ollama_client import OllamaAgent
 
 # ─── Initialize App ──────────────────────────────────────────────────────────
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Pre-warm the LLM and OCR models in the background so first requests skip the cold load."""
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, ollama_agent.warmup)
+    loop.run_in_executor(extraction_executor, ocr_engine.warmup)
+    yield
+    extraction_executor.shutdown(wait=True)
+    await ollama_http.aclose()
+    # Fold any journaled documents into the main JSON file
+    knowledge_store.flush()
+
+
 app = FastAPI(
     title="Demo-OCR",
     description="AI-powered OCR Chat Interface with local LLM",
     version="1.0.0",
+    lifespan=lifespan,
+    # Document payloads carry full extracted text; orjson encodes them in C
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -55,25 +89,155 @@ ocr_engine = OCREngine()
 knowledge_store = KnowledgeStore()
 ollama_agent = OllamaAgent()
 
+# One keep-alive client for the status/health probes instead of a new
+# connection pool per poll
+ollama_http = httpx.AsyncClient(
+    base_url=OLLAMA_URL,
+    timeout=2,
+    limits=httpx.Limits(max_keepalive_connections=10),
+)
+
+# OCR and document parsing are CPU-bound and synchronous; run them here so
+# the event loop keeps serving other requests while a file is processed.
+extraction_executor = ThreadPoolExecutor(
+    max_workers=EXTRACTION_WORKERS,
+    thread_name_prefix="extract",
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the extraction pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        extraction_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+# Uploads are copied to storage in pieces of this size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def write_bytes(path: str, data: bytes):
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def extract_from_file(func, path: str, *args, **kwargs):
+    """
+    Call `func(data, *args, **kwargs)` with `data` a read-only memory map of
+    `path`, so the saved upload is read from the page cache rather than
+    copied into a bytes object.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return func(b"", *args, **kwargs)  # empty files can't be mapped
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return func(memoryview(mm), *args, **kwargs)
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                # A view is still referenced (e.g. by an exception traceback);
+                # the map is released when that view is collected.
+                pass
+
+
+def save_stream(src, path: str) -> tuple[int, str]:
+    """
+    Copy a file object to `path` chunk by chunk, hashing as it goes.
+    Returns (bytes written, SHA-256 hex digest).
+    """
+    size = 0
+    hasher = hashlib.sha256()
+    with open(path, "wb") as dst:
+        while chunk := src.read(UPLOAD_CHUNK_SIZE):
+            dst.write(chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+    return size, hasher.hexdigest()
+
+
+def duplicate_response(document: dict) -> dict:
+    """Upload response for a file whose contents are already stored."""
+    logger.info(f"♻️ Duplicate upload, reusing document {document['id']}")
+    return {
+        "success": True,
+        "duplicate": True,
+        "document": {
+            "id": document["id"],
+            "filename": document["filename"],
+            "extracted_text": document["extracted_text"],
+            "block_count": document["block_count"],
+            "avg_confidence": document["ocr_confidence"],
+            "processing_time": 0.0,
+            "image_url": document["image_path"],
+        },
+    }
+
 # ─── Serve Frontend ──────────────────────────────────────────────────────────
 
 FRONTEND_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "frontend")
 
-app.mount("/css", StaticFiles(directory=os.path.join(FRONTEND_DIR, "css")), name="css")
-app.mount("/js", StaticFiles(directory=os.path.join(FRONTEND_DIR, "js")), name="js")
+# Browsers may reuse css/js/assets for this long before revalidating
+STATIC_MAX_AGE = 3600
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that also sends a Cache-Control max-age."""
+
+    def __init__(self, *args, max_age: int = STATIC_MAX_AGE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cache_control = f"public, max-age={max_age}"
+
+    async def get_response(self, path: str, scope):
+        response = await super().get_response(path, scope)
+        response.headers.setdefault("Cache-Control", self.cache_control)
+        return response
+
+
+app.mount("/css", CachedStaticFiles(directory=os.path.join(FRONTEND_DIR, "css")), name="css")
+app.mount("/js", CachedStaticFiles(directory=os.path.join(FRONTEND_DIR, "js")), name="js")
 app.mount(
     "/assets",
-    StaticFiles(directory=os.path.join(FRONTEND_DIR, "assets")),
+    CachedStaticFiles(directory=os.path.join(FRONTEND_DIR, "assets")),
     name="assets",
 )
 
 
+def load_index_page() -> tuple[bytes, dict]:
+    """Read index.html once, with the validators browsers revalidate against."""
+    index_path = os.path.join(FRONTEND_DIR, "index.html")
+    with open(index_path, "rb") as f:
+        content = f.read()
+    headers = {
+        "ETag": f'"{hashlib.sha256(content).hexdigest()}"',
+        "Last-Modified": formatdate(os.path.getmtime(index_path), usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+    return content, headers
+
+
+INDEX_HTML, INDEX_HEADERS = load_index_page()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of `etag` against an If-None-Match list (RFC 9110)."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
 @app.get("/", response_class=HTMLResponse)
-async def serve_frontend():
+async def serve_frontend(request: Request):
     """Serve the main chat interface."""
-    index_path = os.path.join(FRONTEND_DIR, "index.html")
-    with open(index_path, "r", encoding="utf-8") as f:
-        return HTMLResponse(content=f.read())
+    if etag_matches(request.headers.get("if-none-match"), INDEX_HEADERS["ETag"]):
+        return Response(status_code=304, headers=INDEX_HEADERS)
+    return HTMLResponse(content=INDEX_HTML, headers=INDEX_HEADERS)
 
 
 # ─── Storage Configuration ──────────────────────────────────────────────────
@@ -85,6 +249,13 @@ os.makedirs(IMAGES_DIR, exist_ok=True)
 # Mount storage directory to serve images
 app.mount("/storage", StaticFiles(directory=STORAGE_DIR), name="storage")
 
+# Image uploads (OCR path), matched by MIME type or extension
+IMAGE_MIME_TYPES = frozenset({
+    "image/jpeg", "image/png", "image/webp", "image/bmp",
+    "image/tiff", "image/gif",
+})
+IMAGE_EXTENSIONS = frozenset({".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tiff", ".tif", ".gif"})
+
 # ─── Pydantic Models ─────────────────────────────────────────────────────────
 
 
@@ -116,8 +287,9 @@ async def upload_and_process(
     Images are processed via OCR; PDFs and DOCX files use direct text extraction.
     Stores the result in the knowledge base.
     """
-    import os
-    ext = os.path.splitext((file.filename or "").lower())[1]
+    filename = file.filename or ""
+    _, dot, suffix = filename.rpartition(".")
+    ext = f".{suffix.lower()}" if dot else ""
 
     # Determine if this is a native document or image
     is_document = (
@@ -125,13 +297,7 @@ async def upload_and_process(
         or ext in DOCUMENT_EXTENSIONS
     )
 
-    # Image MIME types (OCR path)
-    image_types = [
-        "image/jpeg", "image/png", "image/webp", "image/bmp",
-        "image/tiff", "image/gif",
-    ]
-    image_extensions = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tiff", ".tif", ".gif"}
-    is_image = file.content_type in image_types or ext in image_extensions
+    is_image = file.content_type in IMAGE_MIME_TYPES or ext in IMAGE_EXTENSIONS
 
     if not is_document and not is_image:
         allowed = "Images (JPG, PNG, WebP, BMP, TIFF), PDF, DOCX"
@@ -140,18 +306,19 @@ async def upload_and_process(
             detail=f"Unsupported file type: {file.content_type or ext}. Allowed: {allowed}",
         )
 
-    # Read file bytes
-    file_bytes = await file.read()
-    file_size = len(file_bytes)
-
-    # Save image to storage for preview
-    import uuid
-    image_ext = file.filename.split(".")[-1] if "." in file.filename else "png"
+    # Save image to storage for preview, streaming from the spooled upload
+    # rather than holding an extra in-memory copy while writing
+    image_ext = suffix if dot else "png"
     image_filename = f"{uuid.uuid4().hex}.{image_ext}"
     image_path = os.path.join(IMAGES_DIR, image_filename)
-    
-    with open(image_path, "wb") as f:
-        f.write(file_bytes)
+
+    file_size, checksum = await run_blocking(save_stream, file.file, image_path)
+
+    # Same contents uploaded before: skip extraction entirely
+    existing = knowledge_store.find_by_checksum(checksum)
+    if existing is not None:
+        await run_blocking(os.remove, image_path)
+        return duplicate_response(existing)
 
     logger.info(f"📤 Processing upload: {file.filename} ({file_size} bytes)")
     logger.info(f"📤 Processing upload: {file.filename} ({file_size} bytes, type={'document' if is_document else 'image'})")
@@ -159,15 +326,20 @@ async def upload_and_process(
     try:
         if is_document:
             # Direct text extraction — no OCR
-            ocr_result = extract_document(
-                file_bytes,
+            ocr_result = await run_blocking(
+                extract_from_file,
+                extract_document,
+                image_path,
                 filename=file.filename or "unknown",
                 mime_type=file.content_type or "",
+                ocr_engine=ocr_engine,
             )
         else:
             # Image — run through OCR engine
-            ocr_result = ocr_engine.extract_text(
-                file_bytes, source_type=source_type, detail=True
+            ocr_result = await run_blocking(
+                extract_from_file,
+                ocr_engine.extract_text,
+                image_path, source_type=source_type, detail=True,
             )
     except Exception as e:
         logger.error(f"Text extraction failed: {e}")
@@ -182,7 +354,8 @@ async def upload_and_process(
         ocr_blocks=ocr_result["blocks"],
         file_size=file_size,
         mime_type=file.content_type or "",
-        image_path=f"/storage/images/{image_filename}"
+        image_path=f"/storage/images/{image_filename}",
+        checksum=checksum,
     )
 
     return {
@@ -206,25 +379,32 @@ async def capture_and_process(request: CaptureRequest):
     """
     logger.info(f"📸 Processing camera capture: {request.filename}")
 
+    # Decode once; the same bytes are saved and handed to OCR
+    try:
+        _, _, data = request.image_base64.rpartition(",")  # strip data URL prefix
+        image_bytes = pybase64.b64decode(data, validate=False)
+    except ValueError as e:
+        logger.warning(f"Camera image decode failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Invalid base64 image: {str(e)}")
+
+    checksum = hashlib.sha256(image_bytes).hexdigest()
+    existing = knowledge_store.find_by_checksum(checksum)
+    if existing is not None:
+        return duplicate_response(existing)
+
     # Save to storage
-    import base64
-    import uuid
+    image_filename = f"{uuid.uuid4().hex}.jpg"
     try:
-        header, data = request.image_base64.split(",", 1)
-        image_bytes = base64.b64decode(data)
-        
-        image_filename = f"{uuid.uuid4().hex}.jpg"
         image_path = os.path.join(IMAGES_DIR, image_filename)
-        with open(image_path, "wb") as f:
-            f.write(image_bytes)
+        await run_blocking(write_bytes, image_path, image_bytes)
     except Exception as e:
         logger.error(f"Failed to save captured image: {e}")
-        image_bytes = b""
         image_filename = ""
 
     try:
-        ocr_result = ocr_engine.extract_from_base64(
-            request.image_base64, source_type="camera", detail=True
+        ocr_result = await run_blocking(
+            ocr_engine.extract_text,
+            image_bytes, source_type="camera", detail=True,
         )
     except Exception as e:
         logger.error(f"Camera OCR failed: {e}")
@@ -237,7 +417,8 @@ async def capture_and_process(request: CaptureRequest):
         source_type="camera",
         ocr_confidence=ocr_result["avg_confidence"],
         ocr_blocks=ocr_result["blocks"],
-        image_path=f"/storage/images/{image_filename}" if image_filename else ""
+        image_path=f"/storage/images/{image_filename}" if image_filename else "",
+        checksum=checksum,
     )
 
     return {
@@ -263,15 +444,14 @@ async def chat(request: ChatRequest):
     sources = []
 
     if request.use_knowledge:
-        context = knowledge_store.get_context_for_query(request.message)
+        context, search_results = knowledge_store.lookup(request.message)
         if context:
-            search_results = knowledge_store.search(request.message)
             sources = [
                 {"filename": r["filename"], "id": r["id"]}
                 for r in search_results
             ]
 
-    response = ollama_agent.chat(
+    response = await ollama_agent.achat(
         user_message=request.message,
         document_context=context,
     )
@@ -321,12 +501,11 @@ async def clear_chat():
 @app.get("/api/ollama/status")
 async def ollama_status():
     """Direct check of Ollama service status."""
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(f"{OLLAMA_URL}/api/tags", timeout=2)
-            return {"status": "connected", "details": r.json()}
-        except Exception as e:
-            return {"status": "disconnected", "error": str(e)}
+    try:
+        r = await ollama_http.get("/api/tags")
+        return {"status": "connected", "details": r.json()}
+    except Exception as e:
+        return {"status": "disconnected", "error": str(e)}
 
 
 @app.get("/api/health")
@@ -335,13 +514,12 @@ async def health():
     ollama_connected = False
     models = []
     
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(f"{OLLAMA_URL}/api/tags", timeout=2)
-            ollama_connected = True
-            models = r.json().get('models', [])
-        except:
-            pass
+    try:
+        r = await ollama_http.get("/api/tags")
+        ollama_connected = True
+        models = r.json().get('models', [])
+    except:
+        pass
 
     return {
         "status": "healthy",
@@ -349,4 +527,5 @@ async def health():
         "model": ollama_agent.model,
         "available_models": [m.get('name') for m in models],
         "knowledge_base": knowledge_store.get_stats(),
+        "response_cache": ollama_agent.cache.stats(),
     }
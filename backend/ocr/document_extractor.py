@@ -1,46 +1,142 @@
 """
 Document Extractor — Text extraction for DOCX, DOC, and PDF files.
-Bypasses OCR; reads text directly from the document structure.
+Reads text directly from the document structure; scanned PDFs with no
+text layer can fall back to OCR.
 """
 
 import io
+import os
+import shutil
+import subprocess
+import tempfile
 import time
 import logging
+import zipfile
 from typing import Optional
 
-logger = logging.getLogger(__name__)
+import numpy as np
 
+logger = logging.getLogger(__name__)
 
-def _make_result(text: str, source_type: str, processing_time: float) -> dict:
+# Scanned PDFs (no text layer) are OCR'd page by page, up to this many pages
+MAX_OCR_PAGES = 20
+# Render scale for OCR'd pages; 2x (~144 dpi) keeps small print legible
+OCR_RENDER_ZOOM = 2
+# A probe page needs more than this many characters to count as having text
+PROBE_MIN_CHARS = 20
+# Below this fraction of probe pages with text, a PDF is treated as scanned
+SCANNED_TEXT_RATIO = 0.6
+# Native .doc converters tried in order: (executable, arguments before the path)
+DOC_CONVERTERS = (
+    ("antiword", ("-m", "UTF-8.txt")),
+    ("catdoc", ("-d", "utf-8")),
+)
+# Seconds a .doc converter may run before the upload is rejected
+DOC_CONVERT_TIMEOUT = 30
+
+
+def _make_result(
+    text: str,
+    source_type: str,
+    processing_time: float,
+    confidence: float = 1.0,
+    lines: Optional[list] = None,
+) -> dict:
     """
     Build a result dict that matches the OCREngine output format,
     so document results can be stored in the knowledge base with the
     same `add_document` call.
+
+    `lines` are the already-stripped, non-empty lines of `text`; extractors
+    that assembled `text` from them pass them in to skip re-splitting.
     """
     # Split into pseudo-blocks (one per non-empty line/paragraph)
-    raw_lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if lines is None:
+        lines = [s for line in text.splitlines() if (s := line.strip())]
     blocks = [
         {
             "text": line,
-            "confidence": 1.0,   # Native extraction is 100% confident
+            "confidence": confidence,  # 1.0 for native extraction
             "bbox": [],          # No bounding boxes for text documents
         }
-        for line in raw_lines
+        for line in lines
     ]
 
     return {
         "text": text,
         "blocks": blocks,
         "block_count": len(blocks),
-        "avg_confidence": 1.0,
+        "avg_confidence": confidence,
         "processing_time_seconds": round(processing_time, 2),
         "source_type": source_type,
     }
 
 
+# WordprocessingML namespace used in word/document.xml
+_W_NS = {"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"}
+_W_VAL = f"{{{_W_NS['w']}}}val"
+# Run content that contributes to a paragraph's text, in document order
+_RUN_CONTENT = "w:r/w:t | w:r/w:tab | w:r/w:br | w:r/w:cr | w:hyperlink/w:r/w:t"
+
+
+def _docx_paragraph_text(paragraph) -> str:
+    """Text of one <w:p> element, matching python-docx's Paragraph.text."""
+    parts = []
+    for node in paragraph.xpath(_RUN_CONTENT, namespaces=_W_NS):
+        tag = node.tag.rpartition("}")[2]
+        if tag == "t":
+            parts.append(node.text or "")
+        elif tag == "tab":
+            parts.append("\t")
+        else:
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _docx_grid_value(element, path: str, default: int) -> int:
+    """Integer w:val of the first `path` match under `element`."""
+    found = element.find(path, _W_NS)
+    if found is None:
+        return default
+    return int(found.get(_W_VAL, default))
+
+
+def _docx_table_rows(table) -> list:
+    """
+    Stripped cell texts of each <w:tr>, laid out like python-docx's Row.cells:
+    a cell spanning several grid columns repeats once per column, and a
+    vertically merged continuation cell repeats the text of the cell above.
+    """
+    rows = []
+    above = {}  # grid column -> cell text in the previous row
+    for row in table.iterfind("w:tr", _W_NS):
+        offset = _docx_grid_value(row, "w:trPr/w:gridBefore", 0)
+        current = {}
+        cells = []
+        for cell in row.iterfind("w:tc", _W_NS):
+            span = _docx_grid_value(cell, "w:tcPr/w:gridSpan", 1)
+            v_merge = cell.find("w:tcPr/w:vMerge", _W_NS)
+            if v_merge is not None and v_merge.get(_W_VAL, "continue") == "continue":
+                text = above.get(offset, "")
+            else:
+                text = "\n".join(
+                    _docx_paragraph_text(p) for p in cell.iterfind("w:p", _W_NS)
+                ).strip()
+            current[offset] = text
+            cells.extend([text] * span)
+            offset += span
+        rows.append(cells)
+        above = current
+    return rows
+
+
 def extract_text_from_docx(file_bytes: bytes) -> dict:
     """
-    Extract text from a .docx file using python-docx.
+    Extract text from a .docx file.
+
+    Reads word/document.xml directly with lxml instead of building
+    python-docx's object model: body paragraphs first, then table rows
+    with cells joined by " | ".
 
     Args:
         file_bytes: Raw .docx file bytes.
@@ -50,28 +146,40 @@ def extract_text_from_docx(file_bytes: bytes) -> dict:
     """
     start = time.time()
     try:
-        import docx  # python-docx
+        from lxml import etree
     except ImportError:
         raise RuntimeError(
-            "python-docx is not installed. Run: pip install python-docx"
+            "lxml is not installed. Run: pip install lxml"
         )
 
-    doc = docx.Document(io.BytesIO(file_bytes))
+    with zipfile.ZipFile(io.BytesIO(file_bytes)) as archive:
+        root = etree.fromstring(archive.read("word/document.xml"))
+    body = root.find("w:body", _W_NS)
+    if body is None:
+        body = root
 
     paragraphs = []
-    for para in doc.paragraphs:
-        text = para.text.strip()
+    lines = []
+
+    def add(text: str):
+        paragraphs.append(text)
+        if "\n" in text:
+            # Line breaks inside a paragraph still become separate blocks
+            lines.extend(s for line in text.splitlines() if (s := line.strip()))
+        else:
+            lines.append(text)
+
+    for para in body.iterfind("w:p", _W_NS):
+        text = _docx_paragraph_text(para).strip()
         if text:
-            paragraphs.append(text)
+            add(text)
 
     # Also extract text from tables
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = " | ".join(
-                cell.text.strip() for cell in row.cells if cell.text.strip()
-            )
+    for table in body.iterfind("w:tbl", _W_NS):
+        for cells in _docx_table_rows(table):
+            row_text = " | ".join(filter(None, cells))
             if row_text:
-                paragraphs.append(row_text)
+                add(row_text)
 
     full_text = "\n".join(paragraphs)
     processing_time = time.time() - start
@@ -79,31 +187,152 @@ def extract_text_from_docx(file_bytes: bytes) -> dict:
     logger.info(
         f"📄 DOCX extracted: {len(paragraphs)} paragraphs in {processing_time:.2f}s"
     )
-    return _make_result(full_text, "docx", processing_time)
+    return _make_result(full_text, "docx", processing_time, lines=lines)
 
 
 def extract_text_from_doc(file_bytes: bytes) -> dict:
     """
     Extract text from a legacy .doc file.
 
-    .doc (Word 97-2003) is a binary format. python-docx cannot read it.
-    We raise a clear error asking the user to convert to DOCX or PDF first.
+    .doc (Word 97-2003) is a binary format python-docx cannot read, so the
+    text is pulled out by a native converter (antiword, else catdoc) when
+    one is installed. Without either, we raise a clear error asking the
+    user to convert to DOCX or PDF first.
     """
-    raise ValueError(
-        "Legacy .doc files (Word 97–2003) are not supported for direct text extraction. "
-        "Please save the file as .docx or .pdf and re-upload."
+    start = time.time()
+    command = next(
+        ([path, *args] for name, args in DOC_CONVERTERS if (path := shutil.which(name))),
+        None,
     )
+    if command is None:
+        raise ValueError(
+            "Legacy .doc files (Word 97–2003) are not supported for direct text extraction. "
+            "Please save the file as .docx or .pdf and re-upload."
+        )
+
+    # The converters need a seekable file, not a pipe
+    with tempfile.NamedTemporaryFile(suffix=".doc") as tmp:
+        tmp.write(file_bytes)
+        tmp.flush()
+        try:
+            proc = subprocess.run(
+                [*command, tmp.name],
+                capture_output=True,
+                timeout=DOC_CONVERT_TIMEOUT,
+                check=True,
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            raise ValueError(f"Could not read .doc file with {os.path.basename(command[0])}: {e}")
+
+    full_text = proc.stdout.decode("utf-8", "replace").strip()
+    processing_time = time.time() - start
+
+    logger.info(
+        f"📄 DOC extracted with {os.path.basename(command[0])} in {processing_time:.2f}s"
+    )
+    return _make_result(full_text, "doc", processing_time)
+
 
+def _render_gray(page, matrix) -> np.ndarray:
+    """Rasterize a page straight to a single-channel pixel array (no PNG round-trip)."""
+    import fitz
 
-def extract_text_from_pdf(file_bytes: bytes) -> dict:
+    pix = page.get_pixmap(matrix=matrix, colorspace=fitz.csGRAY, alpha=False)
+    return np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+
+
+def _looks_scanned(pdf) -> bool:
+    """
+    Decide from a handful of probe pages (first, quartiles, last) whether a
+    PDF is scanned, instead of reading every page's text layer first.
+    Scanned when under SCANNED_TEXT_RATIO of the probes have real text and at
+    least one probe is image-only; a blank cover alone doesn't count.
+    """
+    page_count = len(pdf)
+    if not page_count:
+        return False
+    probes = sorted({0, page_count // 4, page_count // 2, 3 * page_count // 4, page_count - 1})
+    with_text = 0
+    image_only = 0
+    for i in probes:
+        page = pdf[i]
+        if len(page.get_text("text").strip()) > PROBE_MIN_CHARS:
+            with_text += 1
+        elif page.get_images():
+            image_only += 1
+    return image_only > 0 and with_text < SCANNED_TEXT_RATIO * len(probes)
+
+
+def _ocr_pdf_pages(pdf, ocr_engine, page_indexes: list) -> list:
+    """
+    OCR the given pages of an open PDF.
+    Pages are rasterized one after another, then recognized in a single
+    batched engine call (same-sized pages share detector passes).
+    Results keep page order.
+    """
+    import fitz
+
+    if not page_indexes:
+        return []
+    matrix = fitz.Matrix(OCR_RENDER_ZOOM, OCR_RENDER_ZOOM)
+    images = [_render_gray(pdf[i], matrix) for i in page_indexes]
+    return ocr_engine.extract_text_batch(images, source_type="digital", detail=False)
+
+
+def _extract_scanned_pdf(pdf, ocr_engine, start: float) -> dict:
+    """
+    Text for a scanned PDF: pages that do carry a text layer keep it, the
+    rest (up to MAX_OCR_PAGES) are OCR'd. A short text layer is only
+    replaced when OCR finds text on the page.
+    """
+    page_texts = {}
+    to_ocr = []
+    for i, page in enumerate(pdf):
+        page_text = page.get_text("text").strip()
+        if page_text:
+            page_texts[i] = page_text
+        if len(page_text) <= PROBE_MIN_CHARS and len(to_ocr) < MAX_OCR_PAGES:
+            to_ocr.append(i)
+
+    ocr_results = _ocr_pdf_pages(pdf, ocr_engine, to_ocr)
+
+    # Text layers that were kept as-is count as fully confident
+    confidences = [1.0 for i in page_texts if i not in to_ocr]
+    for i, result in zip(to_ocr, ocr_results):
+        if result["block_count"]:
+            confidences.append(result["avg_confidence"])
+        if result["text"].strip():
+            page_texts[i] = result["text"]
+
+    pages_text = [
+        f"--- Page {i + 1} ---\n{page_texts[i]}" for i in sorted(page_texts)
+    ]
+    full_text = "\n\n".join(pages_text)
+    processing_time = time.time() - start
+
+    logger.info(
+        f"📄 Scanned PDF extracted: {len(to_ocr)} pages OCR'd, "
+        f"{len(pages_text)} with text in {processing_time:.2f}s"
+    )
+    return _make_result(
+        full_text,
+        "pdf_scanned",
+        processing_time,
+        confidence=round(sum(confidences) / len(confidences), 4) if confidences else 0.0,
+    )
+
+
+def extract_text_from_pdf(file_bytes: bytes, ocr_engine=None) -> dict:
     """
     Extract text from a PDF file using PyMuPDF (fitz).
 
-    Handles text-based PDFs efficiently. For scanned/image PDFs,
-    this returns empty text (user should use image upload + OCR instead).
+    Handles text-based PDFs efficiently. For scanned/image PDFs, pages are
+    OCR'd with `ocr_engine` when one is given; otherwise empty text is
+    returned (user should use image upload + OCR instead).
 
     Args:
         file_bytes: Raw PDF file bytes.
+        ocr_engine: Optional OCREngine used when the PDF looks scanned.
 
     Returns:
         Result dict compatible with OCREngine output.
@@ -116,15 +345,17 @@ def extract_text_from_pdf(file_bytes: bytes) -> dict:
             "PyMuPDF is not installed. Run: pip install PyMuPDF"
         )
 
-    pdf = fitz.open(stream=file_bytes, filetype="pdf")
-
-    pages_text = []
-    for page_num, page in enumerate(pdf, start=1):
-        page_text = page.get_text("text").strip()
-        if page_text:
-            pages_text.append(f"--- Page {page_num} ---\n{page_text}")
+    # Closed on every path, including when rasterization or OCR raises
+    with fitz.open(stream=file_bytes, filetype="pdf") as pdf:
+        if ocr_engine is not None and _looks_scanned(pdf):
+            logger.info("🔍 PDF looks scanned — running OCR on pages without text")
+            return _extract_scanned_pdf(pdf, ocr_engine, start)
 
-    pdf.close()
+        pages_text = []
+        for page_num, page in enumerate(pdf, start=1):
+            page_text = page.get_text("text").strip()
+            if page_text:
+                pages_text.append(f"--- Page {page_num} ---\n{page_text}")
 
     full_text = "\n\n".join(pages_text)
     processing_time = time.time() - start
@@ -155,7 +386,12 @@ DOCUMENT_EXTENSIONS = {
 }
 
 
-def extract_document(file_bytes: bytes, filename: str, mime_type: str) -> dict:
+def extract_document(
+    file_bytes: bytes,
+    filename: str,
+    mime_type: str,
+    ocr_engine=None,
+) -> dict:
     """
     Route to the correct extractor based on MIME type or file extension.
 
@@ -163,11 +399,11 @@ def extract_document(file_bytes: bytes, filename: str, mime_type: str) -> dict:
         file_bytes: Raw file bytes.
         filename: Original filename (used as fallback for type detection).
         mime_type: MIME type reported by the browser.
+        ocr_engine: Optional OCREngine for PDFs without a text layer.
 
     Returns:
         Result dict compatible with OCREngine output.
     """
-    import os
     ext = os.path.splitext(filename.lower())[1]
 
     # Prefer MIME type; fall back to file extension
@@ -178,7 +414,7 @@ def extract_document(file_bytes: bytes, filename: str, mime_type: str) -> dict:
     elif doc_type == "doc":
         return extract_text_from_doc(file_bytes)
     elif doc_type == "pdf":
-        return extract_text_from_pdf(file_bytes)
+        return extract_text_from_pdf(file_bytes, ocr_engine=ocr_engine)
     else:
         raise ValueError(
             f"Unsupported document type: mime='{mime_type}', ext='{ext}'"
@@ -3,11 +3,20 @@ Image Preprocessor for OCR Enhancement
 Applies multiple CV techniques to maximize OCR accuracy on any document type.
 """
 
+import threading
+
 import cv2
 import numpy as np
-from PIL import Image
-import io
-import base64
+
+# CLAHE objects keep per-call scratch state, so each thread gets its own
+_clahe_local = threading.local()
+
+
+def _clahe() -> "cv2.CLAHE":
+    clahe = getattr(_clahe_local, "clahe", None)
+    if clahe is None:
+        clahe = _clahe_local.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    return clahe
 
 
 class ImagePreprocessor:
@@ -16,24 +25,21 @@ class ImagePreprocessor:
     Handles: receipts, invoices, handwritten notes, ID cards, prescriptions, etc.
     """
 
+    # Structuring element for the background estimate in remove_shadows
+    SHADOW_KERNEL = np.ones((7, 7), np.uint8)
+
     @staticmethod
-    def load_image_from_bytes(image_bytes: bytes) -> np.ndarray:
-        """Load image from raw bytes into OpenCV format."""
+    def load_image_from_bytes(image_bytes) -> np.ndarray:
+        """Load image from raw bytes into OpenCV format (arrays pass through)."""
+        if isinstance(image_bytes, np.ndarray):
+            # Already decoded, e.g. a page rasterized by the PDF extractor
+            return image_bytes
         nparr = np.frombuffer(image_bytes, np.uint8)
         img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
         if img is None:
             raise ValueError("Could not decode image from provided bytes")
         return img
 
-    @staticmethod
-    def load_image_from_base64(base64_string: str) -> np.ndarray:
-        """Load image from base64 encoded string."""
-        # Strip data URL prefix if present
-        if "," in base64_string:
-            base64_string = base64_string.split(",", 1)[1]
-        image_bytes = base64.b64decode(base64_string)
-        return ImagePreprocessor.load_image_from_bytes(image_bytes)
-
     @staticmethod
     def to_grayscale(img: np.ndarray) -> np.ndarray:
         """Convert to grayscale if not already."""
@@ -43,17 +49,17 @@ class ImagePreprocessor:
 
     @staticmethod
     def denoise(img: np.ndarray) -> np.ndarray:
-        """Apply non-local means denoising for cleaner text edges."""
-        if len(img.shape) == 3:
-            return cv2.fastNlMeansDenoisingColored(img, None, 10, 10, 7, 21)
-        return cv2.fastNlMeansDenoising(img, None, 10, 7, 21)
+        """
+        Edge-preserving bilateral smoothing for cleaner text edges.
+        Much cheaper than non-local means, which dominated pipeline time.
+        """
+        return cv2.bilateralFilter(img, 5, 50, 50)
 
     @staticmethod
     def enhance_contrast(img: np.ndarray) -> np.ndarray:
         """Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)."""
         gray = ImagePreprocessor.to_grayscale(img)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        return clahe.apply(gray)
+        return _clahe().apply(gray)
 
     @staticmethod
     def adaptive_threshold(img: np.ndarray) -> np.ndarray:
@@ -73,13 +79,10 @@ class ImagePreprocessor:
         lines = cv2.HoughLinesP(edges, 1, np.pi / 180, 100,
                                 minLineLength=100, maxLineGap=10)
         if lines is not None and len(lines) > 0:
-            angles = []
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                angle = np.degrees(np.arctan2(y2 - y1, x2 - x1))
-                if abs(angle) < 45:  # Only consider near-horizontal lines
-                    angles.append(angle)
-            if angles:
+            seg = lines.reshape(-1, 4).astype(np.float64)  # x1, y1, x2, y2 per segment
+            angles = np.degrees(np.arctan2(seg[:, 3] - seg[:, 1], seg[:, 2] - seg[:, 0]))
+            angles = angles[np.abs(angles) < 45]  # Only consider near-horizontal lines
+            if angles.size:
                 median_angle = np.median(angles)
                 if abs(median_angle) > 0.5:  # Only correct if skew > 0.5 degrees
                     (h, w) = img.shape[:2]
@@ -90,13 +93,13 @@ class ImagePreprocessor:
                                          borderMode=cv2.BORDER_REPLICATE)
         return img
 
-    @staticmethod
-    def remove_shadows(img: np.ndarray) -> np.ndarray:
+    @classmethod
+    def remove_shadows(cls, img: np.ndarray) -> np.ndarray:
         """Remove shadows from document images."""
         rgb_planes = cv2.split(img) if len(img.shape) == 3 else [img]
         result_planes = []
         for plane in rgb_planes:
-            dilated = cv2.dilate(plane, np.ones((7, 7), np.uint8))
+            dilated = cv2.dilate(plane, cls.SHADOW_KERNEL)
             bg = cv2.medianBlur(dilated, 21)
             diff = 255 - cv2.absdiff(plane, bg)
             norm = cv2.normalize(diff, None, alpha=0, beta=255,
@@ -139,10 +142,14 @@ class ImagePreprocessor:
         Run the complete preprocessing pipeline for maximum OCR accuracy.
         
         Pipeline order:
-        1. Load → 2. Resize → 3. Deskew → 4. Shadow Removal →
-        5. Denoise → 6. Contrast Enhancement → 7. Sharpen
+        1. Load → 2. Grayscale → 3. Resize → 4. Deskew → 5. Shadow Removal →
+        6. Denoise → 7. Contrast Enhancement → 8. Sharpen
+
+        Contrast enhancement outputs grayscale anyway, so converting up front
+        lets every later step, resize included, work on one plane instead of three.
         """
         img = cls.load_image_from_bytes(image_bytes)
+        img = cls.to_grayscale(img)
         img = cls.resize_for_ocr(img)
         img = cls.deskew(img)
         img = cls.remove_shadows(img)
@@ -157,22 +164,7 @@ class ImagePreprocessor:
         Lighter pipeline for already-clean digital documents (PDFs, screenshots).
         """
         img = cls.load_image_from_bytes(image_bytes)
-        img = cls.resize_for_ocr(img)
         img = cls.to_grayscale(img)
-        img = cls.enhance_contrast(img)
-        return img
-
-    @classmethod
-    def camera_pipeline(cls, base64_image: str) -> np.ndarray:
-        """
-        Pipeline optimized for camera-captured documents.
-        Extra steps for shadow removal and deskew.
-        """
-        img = cls.load_image_from_base64(base64_image)
         img = cls.resize_for_ocr(img)
-        img = cls.deskew(img)
-        img = cls.remove_shadows(img)
-        img = cls.denoise(img)
         img = cls.enhance_contrast(img)
-        img = cls.sharpen(img)
         return img
@@ -8,6 +8,32 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Common OCR misreads and their fixes
+OCR_REPLACEMENTS = {
+    "websitelapp": "website/app",
+    "changelmodify": "change/modify",
+    "whenan": "when an",
+    "a8": "as",
+    "S1O": "S10",
+    "SI:": "S1.",
+    "S2 ": "S2. ",
+    "(e.g\"": "(e.g.",
+    "Depending o ": "Depending on ",
+}
+# One alternation over every misread (longest first), so fixes take one scan
+_ARTIFACT_RE = re.compile(
+    "|".join(re.escape(k) for k in sorted(OCR_REPLACEMENTS, key=len, reverse=True))
+)
+
+_MULTI_SPACE_RE = re.compile(r'[ \t]{2,}')
+_SPACE_BEFORE_PUNCT_RE = re.compile(r'\s+([;:,.])')
+_EXCESS_NEWLINES_RE = re.compile(r'\n{3,}')
+_SECTION_MARKER_RE = re.compile(r'(?<!\n)\s*(S\d+[\.:])(?!\n)')
+_NUMBERED_REF_RE = re.compile(r'(?<!\n)\s*(\d+\.\d+)\s*')
+_COLON_LINE_END_RE = re.compile(r':\s*\n')
+# A section marker at the start of the text or after a blank line
+_CHUNK_MARKER_RE = re.compile(r'(?:\A|\n\n)(S\d+)\.')
+
 
 def clean_ocr_text(raw_text: str) -> str:
     """
@@ -40,30 +66,20 @@ def clean_ocr_text(raw_text: str) -> str:
 
 def fix_ocr_artifacts(text: str) -> str:
     """Fix common OCR misreads."""
-    replacements = {
-        "websitelapp": "website/app",
-        "changelmodify": "change/modify",
-        "whenan": "when an",
-        "a8": "as",
-        "S1O": "S10",
-        "SI:": "S1.",
-        "S2 ": "S2. ",
-        "(e.g\"": "(e.g.",
-        "Depending o ": "Depending on ",
-    }
-    for old, new in replacements.items():
-        text = text.replace(old, new)
-    return text
+    return _ARTIFACT_RE.sub(lambda m: OCR_REPLACEMENTS[m.group(0)], text)
 
 
 def normalize_whitespace(text: str) -> str:
     """Clean up extra spaces, tabs, and weird gaps."""
+    # Cheap substring checks skip regex scans that cannot match
     # Collapse multiple spaces into one
-    text = re.sub(r'[ \t]{2,}', ' ', text)
+    if "  " in text or "\t" in text:
+        text = _MULTI_SPACE_RE.sub(' ', text)
     # Remove spaces before punctuation
-    text = re.sub(r'\s+([;:,.])', r'\1', text)
+    text = _SPACE_BEFORE_PUNCT_RE.sub(r'\1', text)
     # Normalize line endings
-    text = re.sub(r'\n{3,}', '\n\n', text)
+    if "\n\n\n" in text:
+        text = _EXCESS_NEWLINES_RE.sub('\n\n', text)
     return text
 
 
@@ -74,10 +90,12 @@ def split_into_sections(text: str) -> str:
     """
     # Pattern: S followed by number and a period or colon
     # Put a newline BEFORE each section marker
-    text = re.sub(r'(?<!\n)\s*(S\d+[\.:])(?!\n)', r'\n\n\1', text)
+    if "S" in text:
+        text = _SECTION_MARKER_RE.sub(r'\n\n\1', text)
 
     # Also handle "Section X." or numbered patterns like "43.1"
-    text = re.sub(r'(?<!\n)\s*(\d+\.\d+)\s*', r' [\1]\n', text)
+    if "." in text:
+        text = _NUMBERED_REF_RE.sub(r' [\1]\n', text)
 
     return text
 
@@ -92,7 +110,8 @@ def fix_punctuation(text: str) -> str:
     # Fix trailing colons that should be periods at end of items
     # e.g., "deface the website:" → "deface the website."
     # Only when followed by a newline or section break
-    text = re.sub(r':\s*\n', '.\n', text)
+    if ":" in text:
+        text = _COLON_LINE_END_RE.sub('.\n', text)
 
     return text
 
@@ -106,34 +125,30 @@ def structure_for_llm(text: str, filename: str = "") -> str:
     return header + text
 
 
-def chunk_ocr_text(text: str) -> list[dict]:
+def chunk_ocr_text(text: str, pre_cleaned: bool = False) -> list[dict]:
     """
     Split the document text into structured chunks based on section markers.
     Returns a list of dicts: {"label": "S1", "text": "..."}
+    Pass `pre_cleaned=True` when `text` is already `clean_ocr_text` output.
     """
     if not text:
         return []
 
     # Ensure it's cleaned first
-    cleaned = clean_ocr_text(text)
-    
-    # Split by our standardized section markers (double newline + S followed by number)
-    parts = re.split(r'\n\n(?=S\d+\.)', cleaned)
+    cleaned = text if pre_cleaned else clean_ocr_text(text)
     
+    # One scan for our standardized section markers (double newline + S
+    # followed by number); each section runs until the next marker
+    markers = list(_CHUNK_MARKER_RE.finditer(cleaned))
+
     chunks = []
-    for part in parts:
-        part = part.strip()
-        if not part:
-            continue
-            
-        # Try to extract label (e.g., S1)
-        label_match = re.match(r'^(S\d+)\.', part)
-        if label_match:
-            label = label_match.group(1)
-            content = part[len(label)+1:].strip()
-            chunks.append({"label": label, "text": content})
-        else:
-            # Check for header or other markers
-            chunks.append({"label": "Intro", "text": part})
-            
+    # Text before the first marker (header or other content)
+    intro = cleaned[:markers[0].start() if markers else len(cleaned)].strip()
+    if intro:
+        chunks.append({"label": "Intro", "text": intro})
+
+    for i, match in enumerate(markers):
+        end = markers[i + 1].start() if i + 1 < len(markers) else len(cleaned)
+        chunks.append({"label": match.group(1), "text": cleaned[match.end():end].strip()})
+
     return chunks
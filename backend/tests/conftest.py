@@ -0,0 +1,50 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+from knowledge import store as store_module
+
+
+@pytest.fixture
+def store_paths(tmp_path, monkeypatch):
+    """Point the knowledge store at a temporary data directory."""
+    monkeypatch.setattr(store_module, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(store_module, "DB_FILE", str(tmp_path / "documents.json"))
+    monkeypatch.setattr(store_module, "JOURNAL_FILE", str(tmp_path / "documents.jsonl"))
+    return tmp_path
+
+
+@pytest.fixture
+def store(store_paths):
+    return store_module.KnowledgeStore()
+
+
+class FakeReader:
+    """Stands in for easyocr.Reader so importing main loads no models."""
+
+    def __init__(self, *args, **kwargs):
+        self.calls = []
+
+    def readtext(self, image, **kwargs):
+        self.calls.append(kwargs)
+        return []
+
+    def readtext_batched(self, images, **kwargs):
+        self.calls.append(kwargs)
+        return [[] for _ in images]
+
+
+@pytest.fixture
+def main_module(store_paths, monkeypatch):
+    """A freshly imported main.py backed by a temporary store and a fake OCR reader."""
+    easyocr = types.ModuleType("easyocr")
+    easyocr.Reader = FakeReader
+    easyocr.utils = types.ModuleType("easyocr.utils")
+    easyocr.utils.get_paragraph = lambda results, **kwargs: []
+    monkeypatch.setitem(sys.modules, "easyocr", easyocr)
+    monkeypatch.setitem(sys.modules, "easyocr.utils", easyocr.utils)
+    for name in ("main", "ocr.engine"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return importlib.import_module("main")
@@ -0,0 +1,251 @@
+import io
+import os
+import random
+import threading
+
+import cv2
+import docx
+import fitz
+import numpy as np
+import pytest
+from docx.enum.text import WD_BREAK
+from docx.exceptions import InvalidSpanError
+
+from ocr import document_extractor
+from ocr.document_extractor import (
+    extract_text_from_doc,
+    extract_text_from_docx,
+    extract_text_from_pdf,
+)
+
+
+def make_pdf(pages) -> bytes:
+    """A PDF with one page per entry: a text string, or None for a scanned page."""
+    pdf = fitz.open()
+    _, png = cv2.imencode(".png", np.full((40, 40), 128, np.uint8))
+    for i, text in enumerate(pages):
+        # Pages differ in width so a fake OCR engine can tell them apart
+        page = pdf.new_page(width=300 + 10 * i, height=400)
+        if text is None:
+            page.insert_image(fitz.Rect(20, 20, 120, 120), stream=png.tobytes())
+        else:
+            page.insert_text((72, 72), text)
+    data = pdf.tobytes()
+    pdf.close()
+    return data
+
+
+def page_index(image) -> int:
+    """Recover the page number from the rendered width (see make_pdf)."""
+    if not isinstance(image, np.ndarray):
+        image = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+    return (image.shape[1] // document_extractor.OCR_RENDER_ZOOM - 300) // 10
+
+
+class FakeOCREngine:
+    """Returns "ocr page <n>" per page, or nothing for pages in `blank`."""
+
+    def __init__(self, blank=()):
+        self.blank = set(blank)
+        self.pages = []
+        self._lock = threading.Lock()
+
+    def extract_text(self, image, source_type="upload", detail=True):
+        index = page_index(image)
+        with self._lock:
+            self.pages.append(index)
+        if index in self.blank:
+            return {"text": "", "block_count": 0, "avg_confidence": 0.0}
+        return {"text": f"ocr page {index}", "block_count": 1, "avg_confidence": 0.5}
+
+    def extract_text_batch(self, images, source_type="digital", detail=True):
+        return [self.extract_text(image, source_type, detail) for image in images]
+
+
+def test_text_pdf_is_not_ocrd():
+    engine = FakeOCREngine()
+    result = extract_text_from_pdf(make_pdf(["First page", "Second page"]), engine)
+    assert result["text"] == "--- Page 1 ---\nFirst page\n\n--- Page 2 ---\nSecond page"
+    assert result["source_type"] == "pdf"
+    assert engine.pages == []
+
+
+def test_scanned_pdf_without_engine_returns_empty_text():
+    result = extract_text_from_pdf(make_pdf([None, None]))
+    assert result["text"] == ""
+    assert result["source_type"] == "pdf"
+
+
+def test_scanned_pdf_is_ocrd_in_page_order():
+    engine = FakeOCREngine(blank={1})
+    result = extract_text_from_pdf(make_pdf([None, None, None]), engine)
+    # Pages where OCR found nothing are left out
+    assert result["text"] == "--- Page 1 ---\nocr page 0\n\n--- Page 3 ---\nocr page 2"
+    assert result["source_type"] == "pdf_scanned"
+    assert result["avg_confidence"] == 0.5
+    assert sorted(engine.pages) == [0, 1, 2]
+
+
+def test_scanned_pdf_ocr_stops_at_max_pages(monkeypatch):
+    monkeypatch.setattr(document_extractor, "MAX_OCR_PAGES", 2)
+    engine = FakeOCREngine()
+    result = extract_text_from_pdf(make_pdf([None, None, None]), engine)
+    assert sorted(engine.pages) == [0, 1]
+    assert "ocr page 2" not in result["text"]
+
+
+def open_pdf(pages):
+    return fitz.open(stream=make_pdf(pages), filetype="pdf")
+
+
+LONG_TEXT = "Typed page with a text layer"
+
+
+def test_looks_scanned():
+    assert not document_extractor._looks_scanned(open_pdf([LONG_TEXT] * 4))
+    assert document_extractor._looks_scanned(open_pdf([None] * 4))
+    # Mostly scanned with one typed page
+    assert document_extractor._looks_scanned(open_pdf([LONG_TEXT, None, None, None, None]))
+    # A blank cover (no text, no images) alone doesn't make a PDF scanned
+    assert not document_extractor._looks_scanned(open_pdf(["", LONG_TEXT, LONG_TEXT]))
+
+
+def test_scanned_pdf_keeps_text_layers():
+    engine = FakeOCREngine()
+    result = extract_text_from_pdf(make_pdf([LONG_TEXT, None, None]), engine)
+    assert result["text"] == (
+        f"--- Page 1 ---\n{LONG_TEXT}\n\n"
+        "--- Page 2 ---\nocr page 1\n\n"
+        "--- Page 3 ---\nocr page 2"
+    )
+    assert sorted(engine.pages) == [1, 2]
+    assert result["avg_confidence"] == round((1.0 + 0.5 + 0.5) / 3, 4)
+
+
+def test_short_text_layer_is_kept_when_ocr_finds_nothing():
+    engine = FakeOCREngine(blank={1, 2})
+    result = extract_text_from_pdf(make_pdf([None, "Page 2", "Fee: 10", None]), engine)
+    assert result["text"] == (
+        "--- Page 1 ---\nocr page 0\n\n"
+        "--- Page 2 ---\nPage 2\n\n"
+        "--- Page 3 ---\nFee: 10\n\n"
+        "--- Page 4 ---\nocr page 3"
+    )
+
+
+def python_docx_text(data: bytes) -> str:
+    """The original python-docx based extraction."""
+    doc = docx.Document(io.BytesIO(data))
+    paragraphs = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = " | ".join(c.text.strip() for c in row.cells if c.text.strip())
+            if row_text:
+                paragraphs.append(row_text)
+    return "\n".join(paragraphs)
+
+
+def docx_bytes(doc) -> bytes:
+    buf = io.BytesIO()
+    doc.save(buf)
+    return buf.getvalue()
+
+
+def test_docx_matches_python_docx():
+    doc = docx.Document()
+    doc.add_paragraph("  Intro paragraph  ")
+    doc.add_paragraph("")
+    para = doc.add_paragraph("Name:")
+    para.add_run("\tvalue")
+    para.add_run().add_break(WD_BREAK.LINE)
+    para.add_run("next line")
+    table = doc.add_table(rows=3, cols=3)
+    for r in range(3):
+        for c in range(3):
+            table.cell(r, c).text = f"r{r}c{c}" if (r, c) != (2, 0) else ""
+    table.cell(0, 0).merge(table.cell(0, 1))
+    table.cell(1, 2).merge(table.cell(2, 2))
+    table.cell(1, 0).add_paragraph("second paragraph")
+    doc.add_paragraph("Outro")
+    data = docx_bytes(doc)
+
+    assert extract_text_from_docx(data)["text"] == python_docx_text(data)
+
+
+def test_docx_merged_cells_match_python_docx_on_random_tables():
+    rng = random.Random(11)
+    for _ in range(40):
+        rows, cols = rng.randint(1, 5), rng.randint(1, 5)
+        doc = docx.Document()
+        table = doc.add_table(rows=rows, cols=cols)
+        for r in range(rows):
+            for c in range(cols):
+                table.cell(r, c).text = rng.choice(["", f"cell {r}.{c}"])
+        for _ in range(rng.randint(0, 2)):
+            r0, c0 = rng.randrange(rows), rng.randrange(cols)
+            r1, c1 = rng.randrange(r0, rows), rng.randrange(c0, cols)
+            try:
+                table.cell(r0, c0).merge(table.cell(r1, c1))
+            except InvalidSpanError:
+                # Overlaps an earlier merge that isn't fully inside it
+                pass
+        data = docx_bytes(doc)
+        assert extract_text_from_docx(data)["text"] == python_docx_text(data)
+
+
+# Prints its name and arguments, then the .doc file it was given
+FAKE_CONVERTER = """#!/bin/sh
+printf '%s\\n' "$(basename "$0")" "$@"
+for last; do :; done
+cat "$last"
+"""
+
+
+@pytest.fixture
+def doc_converters(tmp_path, monkeypatch):
+    """Install fake converters by name; shutil.which only finds those."""
+    installed = {}
+
+    def install(name, script=FAKE_CONVERTER):
+        path = tmp_path / name
+        path.write_text(script)
+        os.chmod(path, 0o755)
+        installed[name] = str(path)
+
+    monkeypatch.setattr(document_extractor.shutil, "which", installed.get)
+    return install
+
+
+def test_doc_without_converter_is_rejected(doc_converters):
+    with pytest.raises(ValueError, match="not supported"):
+        extract_text_from_doc(b"binary")
+
+
+def test_doc_prefers_antiword(doc_converters):
+    doc_converters("catdoc")
+    doc_converters("antiword")
+    result = extract_text_from_doc(b"Document body")
+    lines = result["text"].splitlines()
+    assert lines[:3] == ["antiword", "-m", "UTF-8.txt"]
+    assert lines[-1] == "Document body"
+    assert result["source_type"] == "doc"
+
+
+def test_doc_falls_back_to_catdoc(doc_converters):
+    doc_converters("catdoc")
+    lines = extract_text_from_doc(b"Document body")["text"].splitlines()
+    assert lines[:3] == ["catdoc", "-d", "utf-8"]
+    assert lines[-1] == "Document body"
+
+
+def test_doc_converter_failure_is_reported(doc_converters):
+    doc_converters("catdoc", "#!/bin/sh\nexit 1\n")
+    with pytest.raises(ValueError, match="Could not read .doc file with catdoc"):
+        extract_text_from_doc(b"binary")
+
+
+def test_doc_converter_timeout_is_reported(doc_converters, monkeypatch):
+    monkeypatch.setattr(document_extractor, "DOC_CONVERT_TIMEOUT", 0.2)
+    doc_converters("antiword", "#!/bin/sh\nexec sleep 5\n")
+    with pytest.raises(ValueError, match="Could not read .doc file with antiword"):
+        extract_text_from_doc(b"binary")
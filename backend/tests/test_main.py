@@ -0,0 +1,96 @@
+import fitz
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+
+def test_extract_from_file_passes_a_memory_view(main_module, tmp_path):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(b"hello world")
+    seen = []
+
+    def func(data, suffix):
+        seen.append(type(data))
+        return bytes(data[:5]) + suffix
+
+    assert main_module.extract_from_file(func, str(path), b"!") == b"hello!"
+    assert seen == [memoryview]
+
+
+def test_extract_from_file_handles_empty_files(main_module, tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    assert main_module.extract_from_file(bytes, str(path)) == b""
+
+
+def test_extract_from_file_propagates_errors_while_a_view_is_alive(main_module, tmp_path):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(b"data")
+
+    def func(data):
+        raise ValueError(data)
+
+    with pytest.raises(ValueError):
+        main_module.extract_from_file(func, str(path))
+
+
+def test_extract_from_file_feeds_pdf_extraction(main_module, tmp_path):
+    pdf = fitz.open()
+    pdf.new_page().insert_text((72, 72), "Mapped page")
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(pdf.tobytes())
+
+    result = main_module.extract_from_file(
+        main_module.extract_document, str(path), filename="doc.pdf", mime_type="application/pdf"
+    )
+    assert result["text"] == "--- Page 1 ---\nMapped page"
+
+
+def test_capture_rejects_invalid_base64(main_module):
+    client = TestClient(main_module.app)
+    response = client.post(
+        "/api/ocr/capture", json={"image_base64": "data:image/jpeg;base64,abc"}
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid base64 image")
+
+
+def test_ocr_passes_use_the_box_merging_thresholds(main_module):
+    engine = main_module.ocr_engine
+    image = np.zeros((8, 8), dtype=np.uint8)
+    engine._readtext(image)
+    engine._readtext_batched([image, image])
+    assert len(engine._reader.calls) == 2
+    for kwargs in engine._reader.calls:
+        assert kwargs["paragraph"] is False
+        assert (kwargs["width_ths"], kwargs["height_ths"]) == (0.7, 0.7)
+
+
+def test_frontend_is_served_with_an_etag(main_module):
+    client = TestClient(main_module.app)
+    response = client.get("/")
+    assert response.status_code == 200
+    assert response.headers["etag"] == main_module.INDEX_HEADERS["ETag"]
+    assert response.content == main_module.INDEX_HTML
+
+
+@pytest.mark.parametrize(
+    "if_none_match, status",
+    [
+        ("{etag}", 304),
+        ("W/{etag}", 304),
+        ('"other", {etag}', 304),
+        ('"other",W/{etag}', 304),
+        ("*", 304),
+        ('"other"', 200),
+        ("", 200),
+    ],
+)
+def test_frontend_revalidates_against_if_none_match(main_module, if_none_match, status):
+    client = TestClient(main_module.app)
+    etag = main_module.INDEX_HEADERS["ETag"]
+    response = client.get("/", headers={"If-None-Match": if_none_match.format(etag=etag)})
+    assert response.status_code == status
+    if status == 304:
+        assert response.content == b""
+        assert response.headers["etag"] == etag
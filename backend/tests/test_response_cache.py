@@ -0,0 +1,138 @@
+import random
+
+import pytest
+
+from agent import response_cache
+from agent.response_cache import LFUCache, SimilarQuestions, make_key
+
+
+def test_make_key_ignores_case_and_whitespace_only():
+    key = make_key("m", "What is  the Fee?", "ctx")
+    assert key == make_key("m", " what is the fee? ", "ctx")
+    assert key != make_key("m", "What is the Fee?", "other ctx")
+    assert key != make_key("other", "What is the Fee?", "ctx")
+
+
+def test_lfu_evicts_least_frequently_used():
+    cache = LFUCache(capacity=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.put("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+
+
+def test_lfu_breaks_ties_by_least_recent_use():
+    cache = LFUCache(capacity=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.get("a")
+    cache.get("b")
+    cache.put("c", "3")
+    assert cache.get("a") is None
+    assert cache.get("b") == "2"
+
+
+def test_lfu_put_existing_key_updates_value_without_eviction():
+    cache = LFUCache(capacity=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    cache.put("a", "updated")
+    assert cache.get("a") == "updated"
+    assert cache.get("b") == "2"
+    assert cache.stats()["size"] == 2
+
+
+def test_lfu_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = LFUCache(capacity=4, ttl=10)
+    cache.put("a", "1")
+    now[0] += 5
+    assert cache.get("a") == "1"
+    now[0] += 6
+    assert cache.get("a") is None
+    assert cache.stats() == {"size": 0, "capacity": 4, "hits": 1, "misses": 1}
+
+
+def test_lfu_zero_capacity_stores_nothing():
+    cache = LFUCache(capacity=0)
+    cache.put("a", "1")
+    assert cache.get("a") is None
+
+
+def test_lfu_matches_reference_on_random_operations():
+    """Compare against a naive LFU (min by frequency, then last use)."""
+    rng = random.Random(4)
+    cache = LFUCache(capacity=8)
+    reference = {}  # key -> [value, frequency, last use]
+    for tick in range(20_000):
+        key = f"k{rng.randrange(20)}"
+        if rng.random() < 0.5:
+            expected = reference.get(key)
+            if expected is not None:
+                expected[1] += 1
+                expected[2] = tick
+            assert cache.get(key) == (expected[0] if expected else None)
+        else:
+            value = str(tick)
+            if key in reference:
+                reference[key][0] = value
+                reference[key][1] += 1
+                reference[key][2] = tick
+            else:
+                if len(reference) >= 8:
+                    victim = min(reference, key=lambda k: reference[k][1:])
+                    del reference[victim]
+                reference[key] = [value, 1, tick]
+            cache.put(key, value)
+
+
+@pytest.mark.parametrize(
+    "answered, asked",
+    [
+        ("is the password required", "is the password not required"),
+        ("what is the fee for section 3", "what is the fee for section 4"),
+        ("what is the deadline for s1", "what is the deadline for s11"),
+        ("can i submit the form online", "can i submit the form without id"),
+        ("is the office open on weekends", "isn't the office open on weekends"),
+        ("what is the minimum fee", "what is the maximum fee"),
+        ("how do i login", "how do i logout"),
+        ("what is the employee name", "what is the employer name"),
+        ("summarise the document", "summarize the document"),
+    ],
+)
+def test_similar_questions_require_the_same_words(answered, asked):
+    similar = SimilarQuestions()
+    similar.add("ns", answered, "key")
+    assert similar.lookup("ns", asked) is None
+
+
+def test_similar_questions_reuse_reordered_words():
+    similar = SimilarQuestions()
+    similar.add("ns", "What is the fee?", "key")
+    assert similar.lookup("ns", "the FEE is  what") == "key"
+    assert similar.lookup("ns", "what is the fee, the fee?") == "key"
+    assert similar.lookup("ns", "list every fee in the document") is None
+    assert similar.lookup("ns", "what is the fee for section 2") is None
+
+
+def test_similar_questions_are_scoped_to_namespace():
+    similar = SimilarQuestions()
+    similar.add("a", "what is the fee for section 3", "key")
+    assert similar.lookup("b", "what is the fee for section 3") is None
+
+
+def test_similar_questions_forget_oldest_beyond_limit():
+    rng = random.Random(6)
+    questions = [
+        " ".join("".join(rng.choices("abcdefghij", k=6)) for _ in range(3))
+        for _ in range(response_cache.QUESTIONS_PER_NAMESPACE + 1)
+    ]
+    similar = SimilarQuestions()
+    for i, question in enumerate(questions):
+        similar.add("ns", question, f"key{i}")
+    assert similar.lookup("ns", questions[0]) is None
+    assert similar.lookup("ns", questions[1]) == "key1"
@@ -0,0 +1,143 @@
+import os
+
+import orjson
+
+from knowledge import store as store_module
+from knowledge.store import KnowledgeStore
+
+
+def add(store, filename, text, **fields):
+    return store.add_document(
+        filename=filename,
+        extracted_text=text,
+        source_type="digital",
+        ocr_confidence=0.9,
+        ocr_blocks=[],
+        **fields,
+    )
+
+
+def journal_lines():
+    with open(store_module.JOURNAL_FILE, "rb") as f:
+        return [orjson.loads(line) for line in f.read().splitlines()]
+
+
+def test_additions_are_journaled_and_replayed(store):
+    doc = add(store, "a.txt", "S1. The fee is 10 dollars")
+    assert [entry["id"] for entry in journal_lines()] == [doc["id"]]
+
+    reloaded = KnowledgeStore()
+    assert reloaded.get_document(doc["id"])["chunks"] == [
+        {"label": "S1", "text": "The fee is 10 dollars"}
+    ]
+
+
+def test_deletions_are_journaled_as_tombstones(store):
+    kept = add(store, "kept.txt", "S1. Kept")
+    gone = add(store, "gone.txt", "S1. Gone")
+    assert store.delete_document(gone["id"])
+    assert not store.delete_document(gone["id"])
+    assert journal_lines()[-1] == {"deleted": gone["id"]}
+
+    reloaded = KnowledgeStore()
+    assert reloaded.get_document(gone["id"]) is None
+    assert [d["id"] for d in reloaded.get_all_documents()] == [kept["id"]]
+    assert reloaded.get_stats()["total_documents"] == 1
+
+
+def test_journal_is_compacted_every_n_entries(store, monkeypatch):
+    monkeypatch.setattr(store_module, "COMPACT_EVERY", 3)
+    docs = [add(store, f"{i}.txt", f"S1. Document {i}") for i in range(3)]
+    assert not os.path.exists(store_module.JOURNAL_FILE)
+    with open(store_module.DB_FILE, "rb") as f:
+        snapshot = orjson.loads(f.read())
+    assert [d["id"] for d in snapshot["documents"]] == [d["id"] for d in docs]
+    assert snapshot["metadata"]["total_documents"] == 3
+
+
+def test_flush_folds_journal_into_snapshot(store):
+    doc = add(store, "a.txt", "S1. Flushed")
+    store.flush()
+    assert not os.path.exists(store_module.JOURNAL_FILE)
+    assert KnowledgeStore().get_document(doc["id"]) is not None
+
+
+def test_changes_by_another_instance_are_picked_up(store):
+    other = KnowledgeStore()
+    doc = add(other, "a.txt", "S1. Written elsewhere")
+    assert store.get_document(doc["id"]) is not None
+
+
+def test_torn_journal_is_compacted_before_next_append(store_paths):
+    KnowledgeStore()  # creates the empty snapshot
+    with open(store_module.JOURNAL_FILE, "wb") as f:
+        f.write(b'{"id": "torn", "filena')
+
+    store = KnowledgeStore()
+    doc = add(store, "later.txt", "S1. The password is required")
+
+    reloaded = KnowledgeStore()
+    assert reloaded.get_document(doc["id"]) is not None
+    assert reloaded.get_document("torn") is None
+
+
+def test_search_only_scores_indexed_candidates_when_there_are_enough(store):
+    matches = [
+        add(store, f"doc{i}.txt", f"S1. Passwords for portal {i}")
+        for i in range(store_module.MIN_CANDIDATES)
+    ]
+    add(store, "typo.txt", "S1. Passwrd rules for the portal")
+    add(store, "infix.txt", "S1. Reset your superpassword here")
+
+    # "password" is a prefix of the indexed token "passwords"; the typo and
+    # the infix match are not scored once enough documents match exactly
+    results = store.search("password", top_k=10)
+    assert [r["id"] for r in results] == [d["id"] for d in matches]
+
+
+def test_search_falls_back_to_fuzzy_scoring_of_all_documents(store):
+    for i in range(6):
+        add(store, f"doc{i}.txt", f"S1. Office {i} opens at {i} am")
+    typo = add(store, "typo.txt", "S1. Passwrd rules for the portal")
+    infix = add(store, "infix.txt", "S1. Reset your superpassword here")
+
+    # No indexed token starts with "password", so every document is scored
+    assert {r["id"] for r in store.search("password")} == {typo["id"], infix["id"]}
+    assert store.search("xyzzy") == []
+
+
+def test_find_by_checksum(store):
+    doc = add(store, "a.txt", "S1. Same bytes", checksum="abc123")
+    add(store, "b.txt", "S1. Other bytes", checksum="def456")
+    assert store.find_by_checksum("abc123")["id"] == doc["id"]
+    assert store.find_by_checksum("missing") is None
+    assert KnowledgeStore().find_by_checksum("abc123")["id"] == doc["id"]
+
+    store.delete_document(doc["id"])
+    assert store.find_by_checksum("abc123") is None
+
+
+def test_lookup_context_matches_get_context_for_query(store):
+    for i in range(4):
+        add(store, f"doc{i}.txt", f"S1. Office {i} opens at {i} am")
+    add(store, "p1.txt", "S1. The password is printed on the card")
+    add(store, "p2.txt", "S1. Password resets take a day")
+    add(store, "p3.txt", "S2. Keep the password safe")
+    # No token starts with a query word, so only the fuzzy scorer finds it
+    add(store, "typo.txt", "S1. Passwrd expirs yearly. Passwrd expirs yearly")
+
+    for query in ["password expires", "password s1", "office hours", "expirs", "xyz"]:
+        context, results = store.lookup(query)
+        assert context == store.get_context_for_query(query)
+        assert store.search(query, top_k=3) == results[:3]
+
+
+def test_lookup_results_do_not_share_the_cached_values(store):
+    add(store, "a.txt", "S1. The password is printed on the card")
+    context, results = store.lookup("password s1")
+    results[0]["score"] = -1
+    results[0]["label_matches"].clear()
+    results.clear()
+
+    assert store.lookup("password s1") == (context, store.search("password s1"))
+    assert store.lookup("password s1")[1][0]["label_matches"] == {"S1": "S1"}
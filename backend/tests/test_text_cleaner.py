@@ -0,0 +1,93 @@
+import random
+import re
+
+from ocr import text_cleaner
+from ocr.text_cleaner import OCR_REPLACEMENTS, chunk_ocr_text, clean_ocr_text, fix_ocr_artifacts
+
+
+def reference_fix_ocr_artifacts(text: str) -> str:
+    """The original cleaner: one str.replace pass per misread, in table order."""
+    for old, new in OCR_REPLACEMENTS.items():
+        text = text.replace(old, new)
+    return text
+
+
+def reference_chunk(cleaned: str) -> list[dict]:
+    """The original split-then-match chunker, on already cleaned text."""
+    chunks = []
+    for part in re.split(r'\n\n(?=S\d+\.)', cleaned):
+        part = part.strip()
+        if not part:
+            continue
+        label_match = re.match(r'^(S\d+)\.', part)
+        if label_match:
+            label = label_match.group(1)
+            chunks.append({"label": label, "text": part[len(label) + 1:].strip()})
+        else:
+            chunks.append({"label": "Intro", "text": part})
+    return chunks
+
+
+# Misread keys, their fixes, pieces of both and plain separators
+ARTIFACT_FRAGMENTS = (
+    list(OCR_REPLACEMENTS)
+    + list(OCR_REPLACEMENTS.values())
+    + ["S", "1", "2", "O", "I", ":", "a", "8", "when", "an", "(e.g", '"', "o ", " ", "\n", "x"]
+)
+
+# Section markers, numbered references and whitespace the chunker splits on
+SECTION_FRAGMENTS = [
+    "S1.", "S2.", "S10.", "S3:", "S", "3.1", "12", ".", ":", " ", "  ", "\t",
+    "\n", "\n\n", "\n\n\n", "fee", "the office", "Intro text", "SI:", "S1O",
+]
+
+
+def random_text(rng: random.Random, fragments: list, max_parts: int = 12) -> str:
+    return "".join(rng.choice(fragments) for _ in range(rng.randint(0, max_parts)))
+
+
+def test_fix_ocr_artifacts():
+    assert fix_ocr_artifacts("Visit the websitelapp whenan error a8 shown") == (
+        "Visit the website/app when an error as shown"
+    )
+
+
+def test_fix_ocr_artifacts_matches_sequential_replace():
+    rng = random.Random(20)
+    for _ in range(20_000):
+        text = random_text(rng, ARTIFACT_FRAGMENTS)
+        assert fix_ocr_artifacts(text) == reference_fix_ocr_artifacts(text), repr(text)
+
+
+def test_clean_ocr_text_splits_sections():
+    cleaned = clean_ocr_text("Rules  apply . S1. Keep it safe S2 Pay the fee")
+    assert cleaned == "Rules apply.\n\nS1. Keep it safe\n\nS2. Pay the fee"
+
+
+def test_chunk_ocr_text():
+    assert chunk_ocr_text("Header S1. First part S2. Second part") == [
+        {"label": "Intro", "text": "Header"},
+        {"label": "S1", "text": "First part"},
+        {"label": "S2", "text": "Second part"},
+    ]
+    assert chunk_ocr_text("") == []
+
+
+def test_chunk_ocr_text_matches_split_based_chunker():
+    rng = random.Random(30)
+    for _ in range(30_000):
+        text = random_text(rng, SECTION_FRAGMENTS)
+        cleaned = clean_ocr_text(text)
+        assert chunk_ocr_text(text) == reference_chunk(cleaned), repr(text)
+        assert chunk_ocr_text(cleaned, pre_cleaned=True) == reference_chunk(cleaned), repr(text)
+
+
+def test_chunk_ocr_text_pre_cleaned_skips_cleaning(monkeypatch):
+    def fail(text):
+        raise AssertionError("text was cleaned again")
+
+    monkeypatch.setattr(text_cleaner, "clean_ocr_text", fail)
+    assert chunk_ocr_text("Header\n\nS1. First part", pre_cleaned=True) == [
+        {"label": "Intro", "text": "Header"},
+        {"label": "S1", "text": "First part"},
+    ]